@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+#upper bound on SQL statements a single request may issue; catches N+1 regressions at any scale
+QUERY_BUDGETS = {
+    "create_order": 8,
+    "create_orders_bulk": 8,
+    "update_orders_status": 3,
+    "update_order_status": 6,
+    "list_order_details": 3,
+    "list_orders": 3,
+    "list_orders_by_status": 3,
+    "delete_order": 8,
+    "get_order_history": 2,
+    "get_orders_summary": 1,
+    "get_customer_orders": 4,
+    "get_table_bill": 3,
+    "pay_table": 4,
+}
+
+STATUSES = ["pending", "preparing", "ready", "served", "paid"]
+
+def seed(engine, customers: int, menu_items: int, orders: int, history: int, rng: random.Random, chunk: int = 10000):
+    from my_app.models import Customer, MenuItem, Order, OrderItem, OrderHistory
+    with engine.begin() as connection:
+        connection.execute(Customer.__table__.insert(), [{"table_number": i % 50 + 1, "is_present": True} for i in range(customers)])
+        connection.execute(MenuItem.__table__.insert(), [{"name": f"Dish {i}", "price": rng.randint(150, 3000) / 100} for i in range(menu_items)])
+    prices = {i + 1: None for i in range(menu_items)}
+    with engine.connect() as connection:
+        for menu_item_id, price in connection.execute(MenuItem.__table__.select().with_only_columns(MenuItem.id, MenuItem.price)):
+            prices[menu_item_id] = int(round(price * 100))
+    start = datetime.utcnow() - timedelta(days = 30)
+    for offset in range(0, orders, chunk):
+        order_rows, item_rows, history_rows = [], [], []
+        for order_id in range(offset + 1, min(offset + chunk, orders) + 1):
+            steps = rng.randint(0, min(history, len(STATUSES) - 1))
+            items = [(rng.randint(1, menu_items), rng.randint(1, 4)) for _ in range(rng.randint(1, 4))]
+            order_rows.append({"id": order_id, "customer_id": rng.randint(1, customers), "status": STATUSES[steps],
+                               "total": sum(prices[menu_item_id] * quantity for menu_item_id, quantity in items) / 100})
+            item_rows += [{"order_id": order_id, "menu_item_id": menu_item_id, "quantity": quantity, "unit_price_cents": prices[menu_item_id]}
+                          for menu_item_id, quantity in items]
+            placed = start + timedelta(seconds = order_id)
+            history_rows += [{"order_id": order_id, "previous_status": STATUSES[step], "new_status": STATUSES[step + 1],
+                              "timestamp": placed + timedelta(minutes = 5 * (step + 1))} for step in range(steps)]
+        with engine.begin() as connection:
+            connection.execute(Order.__table__.insert(), order_rows)
+            connection.execute(OrderItem.__table__.insert(), item_rows)
+            if history_rows:
+                connection.execute(OrderHistory.__table__.insert(), history_rows)
+
+def scenarios(args, rng: random.Random) -> dict:
+    deletable = list(range(args.orders, 0, -1))
+    lock = threading.Lock()
+
+    def order_payload():
+        return {"customer_id": rng.randint(1, args.customers),
+                "items": [{"menu_item_id": rng.randint(1, args.menu_items), "quantity": rng.randint(1, 3)} for _ in range(rng.randint(1, 4))]}
+
+    def next_deletable():
+        with lock:
+            return deletable.pop()
+
+    return {
+        "create_order": lambda: ("POST", "/orders/", {"json": order_payload()}),
+        "create_orders_bulk": lambda: ("POST", "/orders/bulk", {"json": [order_payload() for _ in range(20)]}),
+        "update_orders_status": lambda: ("PATCH", "/orders/status", {"json": {"ids": rng.sample(range(1, args.orders + 1), 10), "status": rng.choice(STATUSES[1:])}}),
+        "update_order_status": lambda: ("PATCH", f"/orders/{rng.randint(1, args.orders)}/status", {"json": {"status": rng.choice(STATUSES)}}),
+        "list_order_details": lambda: ("GET", f"/orders/{rng.randint(1, args.orders)}", {}),
+        "list_orders": lambda: ("GET", "/orders/", {"params": {"limit": 100, "after": rng.randint(0, args.orders)}}),
+        "list_orders_by_status": lambda: ("GET", "/orders/", {"params": {"status": rng.choice(STATUSES), "limit": 100}}),
+        "get_order_history": lambda: ("GET", f"/orders/{rng.randint(1, args.orders)}/history", {}),
+        "get_orders_summary": lambda: ("GET", "/orders/summary", {}),
+        "get_customer_orders": lambda: ("GET", f"/customers/{rng.randint(1, args.customers)}/orders", {}),
+        "get_table_bill": lambda: ("GET", f"/tables/{rng.randint(1, 50)}/bill", {}),
+        #most seeded tables still have orders in the kitchen, so this mostly measures the rejected (409) path
+        "pay_table": lambda: ("POST", f"/tables/{rng.randint(1, 50)}/pay", {}),
+        "delete_order": lambda: ("DELETE", f"/orders/{next_deletable()}", {}),
+    }
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def count_statements(client, request) -> int:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    #listen on every engine: reads and writes go through separate pools
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(Engine, "before_cursor_execute", listener)
+    try:
+        method, path, kwargs = request
+        client.request(method, path, **kwargs)
+    finally:
+        event.remove(Engine, "before_cursor_execute", listener)
+    return len(statements)
+
+def drive(client, build_request, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+
+    def one(_):
+        method, path, kwargs = build_request()
+        started = time.perf_counter()
+        response = client.request(method, path, **kwargs)
+        return time.perf_counter() - started, response.status_code >= 500
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = concurrency) as pool:
+        for latency, failed in pool.map(one, range(requests)):
+            latencies.append(latency * 1000)
+            errors += failed
+    elapsed = time.perf_counter() - started
+    return {"requests": requests, "errors": errors, "throughput_rps": round(requests / elapsed, 1),
+            "mean_ms": round(statistics.mean(latencies), 3), "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3), "p99_ms": round(percentile(latencies, 0.99), 3)}
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.run", description = "Seed a synthetic SQLite database and benchmark every order route")
+    parser.add_argument("--database", default = "./bench.db", help = "SQLite file to seed (recreated on every run)")
+    parser.add_argument("--orders", type = int, default = 10000)
+    parser.add_argument("--customers", type = int, default = 500)
+    parser.add_argument("--menu-items", type = int, default = 200)
+    parser.add_argument("--history", type = int, default = 3, help = "maximum status transitions per seeded order")
+    parser.add_argument("--requests", type = int, default = 500, help = "requests per route")
+    parser.add_argument("--concurrency", type = int, default = 8)
+    parser.add_argument("--routes", nargs = "*", help = "only run these routes")
+    parser.add_argument("--seed", type = int, default = 42)
+    parser.add_argument("--output", help = "write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    args.routes = args.routes or list(QUERY_BUDGETS)
+    if "delete_order" in args.routes and args.orders < args.requests + 1:
+        parser.error("--orders must exceed --requests so delete_order has rows to remove")
+
+    if os.path.exists(args.database):
+        os.remove(args.database)
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.database}"
+    from fastapi.testclient import TestClient
+    from my_app import database
+    from my_app.main import app
+
+    rng = random.Random(args.seed)
+    database.init_db()
+    started = time.perf_counter()
+    seed(database.engine, args.customers, args.menu_items, args.orders, args.history, rng)
+    report = {"scale": {"orders": args.orders, "customers": args.customers, "menu_items": args.menu_items, "history": args.history,
+                        "requests": args.requests, "concurrency": args.concurrency, "seed_seconds": round(time.perf_counter() - started, 2)},
+              "routes": {}, "over_budget": []}
+
+    with TestClient(app) as client:
+        builders = scenarios(args, rng)
+        for name in args.routes:
+            statements = count_statements(client, builders[name]())
+            result = drive(client, builders[name], args.requests, args.concurrency)
+            result.update({"statements": statements, "query_budget": QUERY_BUDGETS[name]})
+            report["routes"][name] = result
+            if statements > QUERY_BUDGETS[name]:
+                report["over_budget"].append(name)
+
+    output = json.dumps(report, indent = 2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 1 if report["over_budget"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+#several worker processes write orders (and read them back) against one SQLite file at a paced rate,
+#the way several uvicorn workers would, and report every OperationalError they hit
+
+def worker(url: str, profile: str, writes: int, rate: float, results):
+    from sqlalchemy import func, select
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+    from my_app.database import create_engines
+    from my_app.models import Order, OrderHistory
+
+    writer, reader = create_engines(url, profile)
+    Session, ReadSession = sessionmaker(bind = writer), sessionmaker(bind = reader)
+    completed, errors = 0, []
+    started = time.perf_counter()
+    for i in range(writes):
+        #pace to the per-process share of the target rate
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            with Session() as db:
+                order = Order(customer_id = 1, status = "pending", total = 1.0)
+                db.add(order)
+                db.flush()
+                db.add(OrderHistory(order_id = order.id, previous_status = "pending", new_status = "preparing"))
+                order.status = "preparing"
+                db.commit()
+            with ReadSession() as db:
+                db.execute(select(func.count()).select_from(Order)).scalar()
+            completed += 1
+        except OperationalError as e:
+            errors.append(str(e.orig))
+    writer.dispose()
+    reader.dispose()
+    results.put({"completed": completed, "errors": errors, "seconds": time.perf_counter() - started})
+
+def run(url: str, profile: str = "production", processes: int = 4, writes: int = 200, rate: float = 200.0) -> dict:
+    from my_app.database import create_engines, init_db
+    writer, _ = create_engines(url, profile)
+    init_db(writer)
+    writer.dispose()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target = worker, args = (url, profile, writes, rate / processes, results)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    reports = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    #workers time themselves so interpreter start-up is not counted against the write rate
+    elapsed = max(report["seconds"] for report in reports)
+    errors = [error for report in reports for error in report["errors"]]
+    completed = sum(report["completed"] for report in reports)
+    return {"profile": profile, "processes": processes, "target_rate": rate, "completed": completed,
+            "write_rate": round(completed / elapsed, 1), "errors": len(errors),
+            "lock_errors": sum("locked" in error or "busy" in error for error in errors), "sample_errors": errors[:5]}
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.stress", description = "Write to one SQLite file from several processes and count lock errors")
+    parser.add_argument("--database", default = "./stress.db", help = "SQLite file to write (recreated on every run)")
+    parser.add_argument("--profile", default = "production")
+    parser.add_argument("--processes", type = int, default = 4)
+    parser.add_argument("--writes", type = int, default = 500, help = "writes per process")
+    parser.add_argument("--rate", type = float, default = 200.0, help = "target writes per second across all processes")
+    args = parser.parse_args(argv)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.database + suffix):
+            os.remove(args.database + suffix)
+    report = run(f"sqlite:///{args.database}", args.profile, args.processes, args.writes, args.rate)
+    print(json.dumps(report, indent = 2))
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import deque
+from my_app import config, metrics
+
+#these hold a request open for as long as the client listens, so they never take a slot
+EXEMPT_PATHS = ("/orders/stream", "/metrics")
+
+class Shed(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionLimiter:
+    #at most `limit` requests of a class run at once; up to `max_queue` more wait in FIFO order for at most
+    #`timeout` seconds, and anything beyond that is turned away at once instead of slowing everyone down.
+    #All state is touched from the event loop only, so no lock is needed
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            metrics.admission_wait.observe(0.0, self.name)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Shed("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            #release() hands its slot straight to the waiter, so active is not incremented here
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            raise Shed("timeout")
+        except asyncio.CancelledError:
+            #the client went away just as a slot was handed over; pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            metrics.admission_wait.observe(time.perf_counter() - started, self.name)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+limiters = {
+    "read": AdmissionLimiter("read", config.ADMISSION_READ_LIMIT, config.ADMISSION_QUEUE_SIZE, config.ADMISSION_TIMEOUT),
+    "write": AdmissionLimiter("write", config.ADMISSION_WRITE_LIMIT, config.ADMISSION_QUEUE_SIZE, config.ADMISSION_TIMEOUT),
+}
+
+def route_class(method: str, path: str):
+    if path in EXEMPT_PATHS:
+        return None
+    return "read" if method in ("GET", "HEAD", "OPTIONS") else "write"
@@ -0,0 +1,52 @@
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.orm import Session, selectinload
+from my_app.models import (ArchivedOrder, ArchivedOrderHistory, ArchivedOrderItem, Order, OrderHistory, OrderItem)
+
+logger = logging.getLogger(__name__)
+
+ORDER_COLUMNS = ["id", "customer_id", "status", "total", "version", "updated_at", "created_at", "created_at_inferred"]
+ITEM_COLUMNS = ["id", "quantity", "order_id", "menu_item_id", "unit_price_cents"]
+HISTORY_COLUMNS = ["id", "order_id", "previous_status", "new_status", "timestamp"]
+
+def _copy(target, source, columns: list, where):
+    return insert(target.__table__).from_select(columns, select(*[source.__table__.c[name] for name in columns]).where(where))
+
+def archive_orders(db: Session, before: datetime, batch_size: int = 500, pause: float = 0.0, max_batches: Optional[int] = None) -> int:
+    #each batch copies and deletes in its own short transaction, so the writer lock is only held per batch
+    #and an interrupted run simply resumes with the paid orders that are still in the hot tables;
+    #orders without updated_at predate that column and count as old
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(db.scalars(select(Order.id).where(Order.status == "paid", or_(Order.updated_at < before, Order.updated_at.is_(None)))
+                              .order_by(Order.id).limit(batch_size)))
+        if not ids:
+            break
+        try:
+            db.execute(_copy(ArchivedOrder, Order, ORDER_COLUMNS, Order.id.in_(ids)))
+            db.execute(_copy(ArchivedOrderItem, OrderItem, ITEM_COLUMNS, OrderItem.order_id.in_(ids)))
+            db.execute(_copy(ArchivedOrderHistory, OrderHistory, HISTORY_COLUMNS, OrderHistory.order_id.in_(ids)))
+            db.execute(delete(OrderHistory).where(OrderHistory.order_id.in_(ids)))
+            db.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+            db.execute(delete(Order).where(Order.id.in_(ids)))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        archived += len(ids)
+        batches += 1
+        logger.info("Archived %s paid orders (up to order %s), %s so far", len(ids), ids[-1], archived, extra = {"count": len(ids)})
+        if pause:
+            time.sleep(pause)
+    return archived
+
+def load_archived_order(id: int, db: Session) -> Optional[ArchivedOrder]:
+    return (db.query(ArchivedOrder).options(selectinload(ArchivedOrder.items).joinedload(ArchivedOrderItem.menu_item))
+            .filter(ArchivedOrder.id == id).first())
+
+def archived_history(id: int, db: Session) -> list:
+    return db.query(ArchivedOrderHistory).filter(ArchivedOrderHistory.order_id == id).order_by(ArchivedOrderHistory.id).all()
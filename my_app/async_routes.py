@@ -0,0 +1,46 @@
+import inspect
+from fastapi import Depends, FastAPI, params
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from my_app import database, utilities
+
+def _session_params(endpoint) -> list:
+    return [name for name, param in inspect.signature(endpoint).parameters.items()
+            if isinstance(param.default, params.Depends) and param.default.dependency in (database.get_db, database.get_read_db)]
+
+async def _drive(db: AsyncSession, content):
+    iterator = iter(content)
+    done = object()
+    while True:
+        chunk = await db.run_sync(lambda session: next(iterator, done))
+        if chunk is done:
+            break
+        yield chunk
+
+def asyncify(endpoint):
+    #run the sync handler through AsyncSession.run_sync: the handler code is shared,
+    #but database IO happens on the event loop instead of a threadpool slot
+    session_params = _session_params(endpoint)
+    signature = inspect.signature(endpoint)
+    parameters = [param.replace(default = Depends(database.get_async_db), annotation = AsyncSession) if name in session_params else param
+                  for name, param in signature.parameters.items()]
+
+    async def handler(**kwargs):
+        db = kwargs[session_params[0]]
+        result = await db.run_sync(lambda session: endpoint(**{**kwargs, **{name: session for name in session_params}}))
+        if isinstance(result, utilities.SessionStreamingResponse):
+            result.body_iterator = _drive(db, result.content)
+        return result
+
+    handler.__name__ = endpoint.__name__
+    handler.__doc__ = endpoint.__doc__
+    handler.__signature__ = signature.replace(parameters = parameters)
+    return handler
+
+def install(app: FastAPI):
+    for i, route in enumerate(app.router.routes):
+        if not isinstance(route, APIRoute) or inspect.iscoroutinefunction(route.endpoint) or not _session_params(route.endpoint):
+            continue
+        app.router.routes[i] = APIRoute(route.path, asyncify(route.endpoint), response_model = route.response_model,
+                                        status_code = route.status_code, methods = route.methods, name = route.name,
+                                        response_class = route.response_class, dependency_overrides_provider = app)
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from my_app import config
+from my_app.models import CatalogVersion, MenuItem
+
+CatalogEntry = namedtuple("CatalogEntry", ["id", "name", "price"])
+
+class MenuCatalog:
+    def __init__(self, max_size: int, ttl: float, version_check_interval: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = None
+
+    def get_many(self, ids, db: Session) -> dict:
+        self._check_version(db)
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for menu_item_id in ids:
+                cached = self._entries.get(menu_item_id)
+                if cached and cached[1] > now:
+                    self._entries.move_to_end(menu_item_id)
+                    found[menu_item_id] = cached[0]
+                else:
+                    missing.append(menu_item_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            rows = db.execute(select(MenuItem.id, MenuItem.name, MenuItem.price).where(MenuItem.id.in_(missing)))
+            loaded = [CatalogEntry(*row) for row in rows]
+            with self._lock:
+                for entry in loaded:
+                    self._entries[entry.id] = (entry, now + self.ttl)
+                    self._entries.move_to_end(entry.id)
+                    found[entry.id] = entry
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last = False)
+        return found
+
+    def get(self, menu_item_id: int, db: Session):
+        return self.get_many([menu_item_id], db).get(menu_item_id)
+
+    def invalidate(self, ids = None):
+        with self._lock:
+            if ids is None:
+                self._entries.clear()
+            else:
+                for menu_item_id in ids:
+                    self._entries.pop(menu_item_id, None)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "version": self._version}
+
+    def _check_version(self, db: Session):
+        #the version row is shared by all workers, so a menu write in any process drops our entries
+        now = time.monotonic()
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+        version = db.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1)) or 0
+        if version != self._version:
+            self.invalidate()
+            self._version = version
+        self._version_checked_at = now
+
+def bump_version(connection):
+    result = connection.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version = CatalogVersion.version + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(CatalogVersion).values(id = 1, version = 1))
+
+catalog = MenuCatalog(config.CATALOG_CACHE_SIZE, config.CATALOG_CACHE_TTL, config.CATALOG_VERSION_CHECK_INTERVAL)
+
+@event.listens_for(MenuItem, "after_insert")
+@event.listens_for(MenuItem, "after_update")
+@event.listens_for(MenuItem, "after_delete")
+def _menu_item_written(mapper, connection, target):
+    bump_version(connection)
+    catalog.invalidate([target.id])
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _menu_items_bulk_written(context):
+    if context.mapper.class_ is MenuItem:
+        bump_version(context.session.connection())
+        catalog.invalidate()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from my_app import archive, config, database, export, logs, summary, utilities
+
+def backfill_prices(args) -> int:
+    db = database.SessionLocal()
+    try:
+        updated = utilities.backfill_price_snapshots(db)
+        db.commit()
+        print(f"Backfilled unit prices for {updated} order items")
+        return 0
+    finally:
+        db.close()
+
+def verify_prices(args) -> int:
+    db = database.SessionLocal()
+    try:
+        mismatches = utilities.verify_order_totals(db)
+        for mismatch in mismatches:
+            print(json.dumps(mismatch))
+        print(f"{len(mismatches)} orders with totals that do not match their item prices", file = sys.stderr)
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+def check_summary(args) -> int:
+    db = database.SessionLocal()
+    try:
+        drift = summary.check(db)
+        for row in drift:
+            print(json.dumps(row))
+        if drift and args.repair:
+            summary.rebuild(db.connection())
+            db.commit()
+            print(f"Rebuilt order summary counters for {len(drift)} drifted statuses", file = sys.stderr)
+            return 0
+        print(f"{len(drift)} order statuses with drifted summary counters", file = sys.stderr)
+        return 1 if drift else 0
+    finally:
+        db.close()
+
+def archive_orders(args) -> int:
+    db = database.SessionLocal()
+    try:
+        before = datetime.utcnow() - timedelta(days = args.days)
+        archived = archive.archive_orders(db, before, batch_size = args.batch_size, pause = args.pause, max_batches = args.max_batches)
+        print(f"Archived {archived} paid orders last updated before {before.isoformat()}")
+        return 0
+    finally:
+        db.close()
+
+def export_data(args) -> int:
+    db = database.SessionLocal()
+    output = open(args.output, "w", newline = "") if args.output else sys.stdout
+    try:
+        for chunk in export.export(args.dataset, args.format, db, args.start, args.end, batch_size = args.batch_size):
+            output.write(chunk)
+        return 0
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        db.close()
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog = "python -m my_app.cli", description = "Restaurant orders maintenance commands")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    commands.add_parser("backfill-prices", help = "store the current menu price on order items that have no price snapshot").set_defaults(handler = backfill_prices)
+    commands.add_parser("verify-prices", help = "list orders whose total does not match their item price snapshots").set_defaults(handler = verify_prices)
+    check = commands.add_parser("check-summary", help = "recompute the order summary counters and report any drift")
+    check.add_argument("--repair", action = "store_true", help = "rebuild the counters when drift is found")
+    check.set_defaults(handler = check_summary)
+    archiving = commands.add_parser("archive", help = "move paid orders older than the retention window into the archive tables")
+    archiving.add_argument("--days", type = int, default = config.ARCHIVE_RETENTION_DAYS, help = "retention window in days")
+    archiving.add_argument("--batch-size", type = int, default = config.ARCHIVE_BATCH_SIZE, help = "orders moved per transaction")
+    archiving.add_argument("--pause", type = float, default = 0.0, help = "seconds to sleep between batches so other writers get the lock")
+    archiving.add_argument("--max-batches", type = int, default = None, help = "stop after this many batches; rerun to resume")
+    archiving.set_defaults(handler = archive_orders)
+    exporting = commands.add_parser("export", help = "stream orders, items, status history or stage durations as CSV or NDJSON")
+    exporting.add_argument("dataset", choices = list(export.DATASETS))
+    exporting.add_argument("--format", choices = ["ndjson", "csv"], default = "ndjson")
+    exporting.add_argument("--start", type = datetime.fromisoformat, default = None, help = "include from this UTC time (ISO 8601)")
+    exporting.add_argument("--end", type = datetime.fromisoformat, default = None, help = "include up to this UTC time (ISO 8601), exclusive")
+    exporting.add_argument("--batch-size", type = int, default = export.EXPORT_BATCH_SIZE, help = "rows fetched from the database at a time")
+    exporting.add_argument("--output", default = None, help = "file to write; defaults to stdout")
+    exporting.set_defaults(handler = export_data)
+    args = parser.parse_args(argv)
+    #the jobs report progress through logging, which only the app's startup would otherwise configure
+    logs.setup(config.LOG_FORMAT, config.LOG_LEVEL, config.LOG_QUEUE_SIZE, config.LOG_QUEUE_POLICY)
+    try:
+        database.init_db()
+        return args.handler(args)
+    finally:
+        logs.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
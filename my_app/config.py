@@ -0,0 +1,42 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./restaurant.db")
+#"default" keeps SQLite's own settings; "production" enables WAL, tuned pragmas and a single writer connection
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+#comma separated name=value pragmas applied on top of the profile, e.g. "busy_timeout=10000,cache_size=-20000"
+SQLITE_PRAGMAS = dict(pragma.strip().split("=", 1) for pragma in os.getenv("SQLITE_PRAGMAS", "").split(",") if pragma.strip())
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "5"))
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1024"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", "1"))
+
+STATUS_WRITE_COALESCING = os.getenv("STATUS_WRITE_COALESCING", "false").lower() in ("1", "true", "yes")
+STATUS_WRITE_MAX_BATCH = int(os.getenv("STATUS_WRITE_MAX_BATCH", "100"))
+STATUS_WRITE_MAX_DEPTH = int(os.getenv("STATUS_WRITE_MAX_DEPTH", "10000"))
+STATUS_WRITE_TIMEOUT = float(os.getenv("STATUS_WRITE_TIMEOUT", "5"))
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_CACHE_TTL = float(os.getenv("IDEMPOTENCY_CACHE_TTL", "86400"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() in ("1", "true", "yes")
+
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop")
+
+#per-process concurrency limits for read (GET) and write requests; excess requests queue for up to
+#ADMISSION_TIMEOUT seconds and are shed with 503 once ADMISSION_QUEUE_SIZE are already waiting
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "false").lower() in ("1", "true", "yes")
+ADMISSION_READ_LIMIT = int(os.getenv("ADMISSION_READ_LIMIT", "32"))
+ADMISSION_WRITE_LIMIT = int(os.getenv("ADMISSION_WRITE_LIMIT", "4"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", "2"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
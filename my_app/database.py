@@ -1,21 +1,136 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, session
+from sqlalchemy.schema import CreateTable
+from . import config, metrics, summary
+from .config import DATABASE_URL
 from .models import Base
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./restaurant.db")
+#an async driver in DATABASE_URL (e.g. sqlite+aiosqlite://) switches the order routes to async def handlers;
+#a sync engine on the same database stays available for startup, CLI and background jobs
+database_url = make_url(DATABASE_URL)
+ASYNC_MODE = database_url.get_dialect().is_async
+SYNC_DATABASE_URL = database_url.set(drivername = database_url.get_backend_name()) if ASYNC_MODE else database_url
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+SQLITE_PROFILES = {
+    "default": {"pragmas": {}, "writer_pool_size": None},
+    #WAL lets readers run alongside the writer; one pooled writer connection per process serializes writes in the
+    #pool instead of in SQLite's lock, and busy_timeout covers the writers of other worker processes
+    "production": {"pragmas": {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000,
+                               "mmap_size": 268435456, "cache_size": -65536, "temp_store": "MEMORY"},
+                   "writer_pool_size": 1},
+}
+
+def _set_pragmas(engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_engines(url, profile: str = "default", pragmas: dict = None, read_pool_size: int = 5):
+    #returns (writer, reader) engines for the same database; only SQLite gets the profile applied
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        writer = create_engine(url)
+        return writer, create_engine(url, pool_size = read_pool_size)
+    settings = SQLITE_PROFILES[profile]
+    pragmas = {**settings["pragmas"], **(pragmas or {})}
+    writer_pool = {"pool_size": settings["writer_pool_size"], "max_overflow": 0} if settings["writer_pool_size"] else {}
+    writer = create_engine(url, connect_args = {"check_same_thread": False}, **writer_pool)
+    reader = create_engine(url, connect_args = {"check_same_thread": False}, pool_size = read_pool_size)
+    _set_pragmas(writer, pragmas)
+    #query_only turns an accidental write on a read connection into an error instead of a lock fight with the writer
+    _set_pragmas(reader, {**pragmas, "query_only": "ON"})
+    return writer, reader
+
+engine, read_engine = create_engines(SYNC_DATABASE_URL, config.SQLITE_PROFILE, config.SQLITE_PRAGMAS, config.READ_POOL_SIZE)
 SessionLocal = sessionmaker(bind = engine, autocommit = False, autoflush = False)
+ReadSessionLocal = sessionmaker(bind = read_engine, autocommit = False, autoflush = False)
+metrics.instrument_pool(engine)
+metrics.instrument_pool(read_engine)
+
+async_engine = create_async_engine(database_url) if ASYNC_MODE else None
+if async_engine is not None:
+    metrics.instrument_pool(async_engine.sync_engine)
+    if database_url.get_backend_name() == "sqlite":
+        _set_pragmas(async_engine.sync_engine, {**SQLITE_PROFILES[config.SQLITE_PROFILE]["pragmas"], **config.SQLITE_PRAGMAS})
+AsyncSessionLocal = async_sessionmaker(bind = async_engine, autoflush = False, expire_on_commit = False)
+
+def init_db(bind = engine):
+    Base.metadata.create_all(bind = bind)
+    upgrade_db(bind)
+
+#run once, when upgrade_db adds the column named in the key; orders never kept their creation time, so the first
+#status change (or failing that, the last update) is the closest record of it, and the estimate is flagged as such
+BACKFILLS = {
+    "orders.created_at_inferred": "UPDATE orders SET created_at_inferred = 1, created_at = COALESCE((SELECT MIN(timestamp) FROM order_history "
+                                  "WHERE order_history.order_id = orders.id), updated_at) WHERE created_at IS NULL",
+    "archived_orders.created_at_inferred": "UPDATE archived_orders SET created_at_inferred = 1, created_at = COALESCE((SELECT MIN(timestamp) "
+                                           "FROM archived_order_history WHERE archived_order_history.order_id = archived_orders.id), updated_at) "
+                                           "WHERE created_at IS NULL",
+}
+
+def _needs_autoincrement(connection, table) -> bool:
+    if connection.dialect.name != "sqlite" or not table.dialect_options["sqlite"]["autoincrement"]:
+        return False
+    sql = connection.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name})
+    return "AUTOINCREMENT" not in sql.upper()
 
-def init_db():
-    Base.metadata.create_all(bind = engine)
+def _rebuild_with_autoincrement(connection, table):
+    #without AUTOINCREMENT SQLite hands the highest id out again once that row is deleted, and archived rows keep
+    #their ids; the table is copied into one created from the model, and its sequence starts past the archive too
+    ddl = str(CreateTable(table).compile(dialect = connection.dialect))
+    connection.execute(text(ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE _new_{table.name} (", 1)))
+    columns = ", ".join(column.name for column in table.columns)
+    connection.execute(text(f"INSERT INTO _new_{table.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    connection.execute(text(f"DROP TABLE {table.name}"))
+    connection.execute(text(f"ALTER TABLE _new_{table.name} RENAME TO {table.name}"))
+    highest = f"MAX((SELECT COALESCE(MAX(id), 0) FROM {table.name}), (SELECT COALESCE(MAX(id), 0) FROM archived_{table.name}))"
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+    connection.execute(text(f"INSERT INTO sqlite_sequence (name, seq) VALUES (:name, {highest})"), {"name": table.name})
+
+def upgrade_db(bind = engine):
+    #create_all skips tables that already exist, so columns and indexes added since a database file was created are built here
+    with bind.begin() as connection:
+        #inspect through the same connection: the production profile's writer pool holds only one
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            added = [column for column in table.columns if column.name not in existing_columns]
+            for column in added:
+                column_type = column.type.compile(dialect = connection.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+            for column in added:
+                if f"{table.name}.{column.name}" in BACKFILLS:
+                    connection.execute(text(BACKFILLS[f"{table.name}.{column.name}"]))
+            #the rebuild drops the table's indexes and triggers; both are recreated below
+            if _needs_autoincrement(connection, table):
+                _rebuild_with_autoincrement(connection, table)
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+        summary.install(connection)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db():
+    #for handlers that only read: served from the read pool so they never wait on the writer connection
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
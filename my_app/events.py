@@ -0,0 +1,93 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+class OrderEvent:
+    def __init__(self, id: int, type: str, order_id: int, status: Optional[str], customer_id: Optional[int], table_number: Optional[int]):
+        self.id = id
+        self.type = type
+        self.order_id = order_id
+        self.status = status
+        self.customer_id = customer_id
+        self.table_number = table_number
+        self.timestamp = datetime.utcnow()
+
+    def matches(self, statuses: Optional[set], table_number: Optional[int]) -> bool:
+        if statuses and self.type != "order.deleted" and self.status not in statuses:
+            return False
+        return table_number is None or self.table_number == table_number
+
+    def to_sse(self) -> str:
+        data = {"order_id": self.order_id, "status": self.status, "customer_id": self.customer_id,
+                "table_number": self.table_number, "timestamp": self.timestamp.isoformat()}
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(data)}\n\n"
+
+class Broadcaster:
+    #one in-process ring buffer feeds every subscriber; publishing only wakes waiting clients,
+    #and reconnecting clients replay from the buffer instead of re-querying the database
+    def __init__(self, history: int = 1000):
+        self._events = deque(maxlen = history)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    @property
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._waiters)
+
+    def publish(self, type: str, order_id: int, status: Optional[str] = None, customer_id: Optional[int] = None,
+                table_number: Optional[int] = None) -> OrderEvent:
+        with self._lock:
+            event = OrderEvent(self._next_id, type, order_id, status, customer_id, table_number)
+            self._events.append(event)
+            self._next_id += 1
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+        return event
+
+    def since(self, last_event_id: int) -> tuple:
+        #returns the buffered events after last_event_id, and whether the buffer still reaches back that far
+        with self._lock:
+            events = [event for event in self._events if event.id > last_event_id]
+            #ids restart at 1 with every process, so an id from the future means the client saw another worker or an
+            #earlier run of this one and cannot be resumed either
+            complete = last_event_id <= self.last_event_id and (not self._events or self._events[0].id <= last_event_id + 1)
+        return events, complete
+
+    async def subscribe(self, last_event_id: Optional[int] = None, statuses: Optional[set] = None,
+                        table_number: Optional[int] = None, keepalive: float = 15.0):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        self._waiters.add(waiter)
+        try:
+            last = self.last_event_id if last_event_id is None else last_event_id
+            while True:
+                waiter[1].clear()
+                events, complete = self.since(last)
+                if not complete:
+                    #the client fell too far behind the buffer, or holds an id this process never issued,
+                    #and has to refetch its view
+                    current = self.last_event_id
+                    yield f"event: reset\ndata: {json.dumps({'last_event_id': current})}\n\n"
+                    last = min(last, current)
+                for event in events:
+                    last = event.id
+                    if event.matches(statuses, table_number):
+                        yield event.to_sse()
+                if events:
+                    continue
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self._waiters.discard(waiter)
+
+broadcaster = Broadcaster()
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session
+from my_app import schemas
+from my_app.models import (ArchivedOrder, ArchivedOrderHistory, ArchivedOrderItem, Order, OrderHistory, OrderItem)
+
+EXPORT_BATCH_SIZE = 1000
+
+#the hot tables first, then orders the archival job has moved out
+SOURCES = [(Order, OrderItem, OrderHistory), (ArchivedOrder, ArchivedOrderItem, ArchivedOrderHistory)]
+
+#statuses an order moves out of; the final one has no duration
+STAGES = [status.value for status in schemas.OrderStatus][:-1]
+
+COLUMNS = {
+    "orders": ["id", "customer_id", "status", "total", "created_at", "updated_at"],
+    "items": ["id", "order_id", "menu_item_id", "quantity", "unit_price"],
+    "history": ["id", "order_id", "previous_status", "new_status", "timestamp"],
+    "stages": ["order_id", "status", "created_at"] + [f"{stage}_seconds" for stage in STAGES] + ["total_seconds"],
+}
+
+def _utc(value: datetime) -> datetime:
+    #timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo = None) if value.tzinfo is not None else value
+
+def _between(column, start: Optional[datetime], end: Optional[datetime]) -> list:
+    start, end = start and _utc(start), end and _utc(end)
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column < end)
+    return conditions
+
+def _stream(db: Session, statement, batch_size: int):
+    #yield_per keeps one batch of rows in memory; SQLite's cursor steps through the rest lazily
+    return db.execute(statement.execution_options(yield_per = batch_size))
+
+#rows come in creation order, so a time range is a seek on the (created_at, id) indexes rather than a full scan
+def _orders(db, start, end, batch_size):
+    for order, _, _ in SOURCES:
+        statement = (select(order.id, order.customer_id, order.status, order.total, order.created_at, order.updated_at)
+                     .where(*_between(order.created_at, start, end)).order_by(order.created_at, order.id))
+        for row in _stream(db, statement, batch_size):
+            yield row._asdict()
+
+def _items(db, start, end, batch_size):
+    for order, item, _ in SOURCES:
+        statement = (select(item.id, item.order_id, item.menu_item_id, item.quantity, item.unit_price_cents)
+                     .join(order, order.id == item.order_id).where(*_between(order.created_at, start, end))
+                     .order_by(order.created_at, order.id, item.id))
+        for id, order_id, menu_item_id, quantity, unit_price_cents in _stream(db, statement, batch_size):
+            yield {"id": id, "order_id": order_id, "menu_item_id": menu_item_id, "quantity": quantity,
+                   "unit_price": unit_price_cents / 100 if unit_price_cents is not None else None}
+
+def _history(db, start, end, batch_size):
+    for _, _, history in SOURCES:
+        statement = (select(history.id, history.order_id, history.previous_status, history.new_status, history.timestamp)
+                     .where(*_between(history.timestamp, start, end)).order_by(history.timestamp, history.id))
+        for row in _stream(db, statement, batch_size):
+            yield row._asdict()
+
+def _stage_row(order_id, status, created_at, durations, last_change):
+    row = {"order_id": order_id, "status": status, "created_at": created_at}
+    row.update({f"{stage}_seconds": durations.get(stage) for stage in STAGES})
+    row["total_seconds"] = (last_change - created_at).total_seconds() if created_at is not None and last_change is not None else None
+    return row
+
+def stage_durations(transitions) -> Iterator[dict]:
+    #transitions are (order_id, created_at, previous_status, new_status, timestamp), grouped by order and in timestamp order;
+    #an order's stages are closed as soon as the next order id shows up, so only one order is held at a time
+    current = None
+    for order_id, created_at, previous_status, new_status, timestamp in transitions:
+        if current is None or current[0] != order_id:
+            if current is not None:
+                yield _stage_row(*current)
+            #an order enters its first stage when it is created
+            current = [order_id, previous_status, created_at, {}, created_at]
+        _, _, _, durations, entered = current
+        if entered is not None and timestamp is not None:
+            durations[previous_status] = durations.get(previous_status, 0.0) + (timestamp - entered).total_seconds()
+        current[1], current[4] = new_status, timestamp
+    if current is not None:
+        yield _stage_row(*current)
+
+def _stages(db, start, end, batch_size):
+    for order, _, history in SOURCES:
+        #an estimated creation time would make up the pending and total durations, so those are left unknown
+        created_at = case((order.created_at_inferred, None), else_ = order.created_at)
+        statement = (select(history.order_id, created_at, history.previous_status, history.new_status, history.timestamp)
+                     .join(order, order.id == history.order_id).where(*_between(order.created_at, start, end))
+                     .order_by(order.created_at, order.id, history.timestamp))
+        yield from stage_durations(_stream(db, statement, batch_size))
+
+DATASETS = {"orders": _orders, "items": _items, "history": _history, "stages": _stages}
+
+def iter_rows(dataset: str, db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[dict]:
+    return DATASETS[dataset](db, start, end, batch_size)
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+CHUNK_SIZE = 64 * 1024
+
+def _chunks(lines) -> Iterator[str]:
+    #one response chunk per ~64KB rather than per row
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+def to_ndjson(rows) -> Iterator[str]:
+    return _chunks(json.dumps({key: _value(value) for key, value in row.items()}) + "\n" for row in rows)
+
+def _csv_lines(rows, columns: list) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames = columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: _value(value) for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def to_csv(rows, columns: list) -> Iterator[str]:
+    return _chunks(_csv_lines(rows, columns))
+
+def export(dataset: str, format: str, db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+           batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    rows = iter_rows(dataset, db, start, end, batch_size)
+    return to_csv(rows, COLUMNS[dataset]) if format == "csv" else to_ndjson(rows)
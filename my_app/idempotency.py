@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+from my_app import config
+
+class IdempotencyCache:
+    #recent Idempotency-Key -> response, plus the creations still in flight, so a retried or duplicated
+    #request is answered from memory or waits for the original instead of running the write again
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.collapsed = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key: str, now: float):
+        cached = self._entries.get(key)
+        if cached and cached[1] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+        return None
+
+    def begin(self, key: str, fingerprint: str, wait: bool = True) -> tuple:
+        #returns ("cached", response), ("wait", future of the in-flight creation), ("lead", future the caller must
+        #finish()) or ("mismatch", None) when the key was first used with a different request body
+        with self._lock:
+            cached = self._cached(key, time.monotonic())
+            if cached is not None:
+                return ("cached", cached[1]) if cached[0] == fingerprint else ("mismatch", None)
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None and in_flight[0] != fingerprint:
+                return "mismatch", None
+            if in_flight is not None and wait:
+                self.collapsed += 1
+                return "wait", in_flight[1]
+            future = Future()
+            if in_flight is None:
+                self._in_flight[key] = (fingerprint, future)
+            return "lead", future
+
+    def finish(self, key: str, fingerprint: str, future: Future, response = None, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._in_flight.get(key, (None, None))[1] is future:
+                del self._in_flight[key]
+            #failures are not remembered: the client's next retry runs the creation again
+            if error is None:
+                self._entries[key] = ((fingerprint, response), time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last = False)
+        if error is None:
+            future.set_result(response)
+        else:
+            future.set_exception(error)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "in_flight": len(self._in_flight), "hits": self.hits, "collapsed": self.collapsed}
+
+orders = IdempotencyCache(config.IDEMPOTENCY_CACHE_SIZE, config.IDEMPOTENCY_CACHE_TTL)
@@ -0,0 +1,97 @@
+import json
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+#request-scoped fields set by the request middleware and stamped onto every record logged while it runs
+log_context: ContextVar[dict] = ContextVar("log_context", default = {})
+
+#record attributes copied into the JSON line when a log call passes them through extra=
+FIELDS = ("request_id", "method", "route", "status", "latency_ms", "sql", "db_ms", "order_id", "order_status", "customer_id", "count")
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+class ContextFilter(logging.Filter):
+    #runs on the calling thread, where the request's context is visible
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = {"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec = "milliseconds"),
+                "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                line[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line["exception"] = record.exc_text
+        return json.dumps(line, default = str)
+
+class BoundedQueueHandler(QueueHandler):
+    #hands records to the listener thread; when the queue is full it either drops them (counted) or waits for room
+    def __init__(self, records: queue.Queue, block: bool = False):
+        super().__init__(records)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        #unlike QueueHandler.prepare, leave msg % args to the listener thread; only tracebacks are rendered
+        #here because the frames they point at do not outlive the request
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_handler: Optional[BoundedQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def dropped() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+def setup(format: str = "text", level: str = "INFO", queue_size: int = 10000, policy: str = "drop", stream = None):
+    global _handler, _listener
+    stop()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if format == "json" else logging.Formatter(TEXT_FORMAT))
+    #queue_size 0 writes on the calling thread, as basicConfig did
+    if queue_size > 0:
+        _handler = BoundedQueueHandler(queue.Queue(queue_size), block = policy == "block")
+        _listener = QueueListener(_handler.queue, output, respect_handler_level = True)
+        _listener.start()
+        handler = _handler
+    else:
+        handler = output
+    handler.addFilter(ContextFilter())
+    handler._my_app = True
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+def stop():
+    #detaches the handler and drains whatever is still queued before returning
+    global _handler, _listener
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if getattr(h, "_my_app", False)]:
+        root.removeHandler(existing)
+    if _listener is not None:
+        _listener.stop()
+    _handler, _listener = None, None
@@ -1,138 +1,444 @@
-from my_app import database, schemas, utilities
-from my_app.models import Customer, Order, OrderItem, MenuItem, OrderHistory
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from my_app import admission, archive, async_routes, config, database, export, idempotency, logs, metrics, schemas, serializers, summary, utilities, writer
+from my_app.catalog import catalog
+from my_app.events import broadcaster
+from my_app.models import Customer, Order, OrderItem, OrderHistory
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload, joinedload
+from starlette.routing import Match
+from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import List, Optional
 import logging
+import time
+import uuid
 
-logging.basicConfig(level = logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title = "Restaurant orders API")
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+metrics.registry.add_collector("menu_catalog_hits", "Menu catalog cache hits", lambda: catalog.hits)
+metrics.registry.add_collector("menu_catalog_misses", "Menu catalog cache misses", lambda: catalog.misses)
+metrics.registry.add_collector("menu_catalog_size", "Menu items held in the catalog cache", lambda: catalog.stats()["size"])
+metrics.registry.add_collector("status_write_queue_depth", "Status updates waiting for the writer", lambda: writer.status_queue.stats()["depth"])
+metrics.registry.add_collector("status_write_batches", "Batches committed by the status writer", lambda: writer.status_queue.batches)
+metrics.registry.add_collector("status_write_last_batch_size", "Size of the last status write batch", lambda: writer.status_queue.last_batch_size)
+metrics.registry.add_collector("status_write_rejected", "Status updates rejected because the writer queue was full", lambda: writer.status_queue.rejected)
+metrics.registry.add_collector("status_write_max_batch_size", "Largest status write batch", lambda: writer.status_queue.max_batch_size)
+metrics.registry.add_collector("order_stream_subscribers", "Clients connected to the order event stream", lambda: broadcaster.subscribers)
+metrics.registry.add_collector("idempotency_replays", "Order creations answered from the idempotency cache", lambda: idempotency.orders.hits)
+metrics.registry.add_collector("idempotency_collapsed", "Duplicate order creations that waited for the in-flight original", lambda: idempotency.orders.collapsed)
+metrics.registry.add_collector("log_records_dropped", "Log records dropped because the log queue was full", logs.dropped)
+metrics.registry.add_collector("admission_read_active", "Read requests holding an admission slot", lambda: admission.limiters["read"].active)
+metrics.registry.add_collector("admission_read_queued", "Read requests waiting for an admission slot", lambda: admission.limiters["read"].queued)
+metrics.registry.add_collector("admission_write_active", "Write requests holding an admission slot", lambda: admission.limiters["write"].active)
+metrics.registry.add_collector("admission_write_queued", "Write requests waiting for an admission slot", lambda: admission.limiters["write"].queued)
+
+def _publish(type: str, order: Order):
+    broadcaster.publish(type, order.id, order.status, order.customer_id, order.customer.table_number if order.customer else None)
+
+def _route_path(request: Request) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+#declared before the metrics middleware so it runs inside it: shed requests are still counted and logged
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    route_class = admission.route_class(request.method, request.url.path) if config.ADMISSION_CONTROL else None
+    if route_class is None:
+        return await call_next(request)
+    limiter = admission.limiters[route_class]
+    try:
+        await limiter.acquire()
+    except admission.Shed as shed:
+        metrics.admission_shed.inc(route_class, shed.reason)
+        return JSONResponse(status_code = 503, content = {"detail": "Server is busy, retry later"},
+                            headers = {"Retry-After": str(config.ADMISSION_RETRY_AFTER)})
+    #released once the handler has produced its response; a streamed body is sent after the slot is freed
+    try:
+        return await call_next(request)
+    finally:
+        limiter.release()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    method, route = request.method, _route_path(request)
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    log_token = logs.log_context.set({"request_id": request_id, "method": method, "route": route})
+    stats = metrics.RequestStats()
+    token = metrics.current_request.set(stats)
+    metrics.requests_in_flight.inc(method, route)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.requests_in_flight.dec(method, route)
+        metrics.requests_total.inc(method, route, status_code)
+        metrics.request_duration.observe(elapsed, method, route)
+        metrics.request_statements.observe(stats.statements, method, route)
+        metrics.request_db_time.observe(stats.db_time, method, route)
+        metrics.current_request.reset(token)
+        logger.info("%s %s %s %.1fms sql=%s db=%.1fms", method, route, status_code, elapsed * 1000, stats.statements, stats.db_time * 1000,
+                    extra = {"status": status_code, "latency_ms": round(elapsed * 1000, 3), "sql": stats.statements, "db_ms": round(stats.db_time * 1000, 3)})
+        logs.log_context.reset(log_token)
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content = metrics.registry.render(), media_type = "text/plain; version=0.0.4; charset=utf-8")
+
 @app.on_event("startup")
 def startup_event():
+    logs.setup(config.LOG_FORMAT, config.LOG_LEVEL, config.LOG_QUEUE_SIZE, config.LOG_QUEUE_POLICY)
     database.init_db()
+    #async mode runs handlers on the event loop, where waiting on the writer thread would stall every request
+    if config.STATUS_WRITE_COALESCING and not database.ASYNC_MODE:
+        writer.status_queue.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    writer.status_queue.stop()
+    logs.stop()
 
 @app.post("/orders/", response_model = schemas.OrderResponse)
-def create_order(payload: schemas.OrderCreate, db: Session = Depends(database.get_db)):
-    customer = db.query(Customer).filter(Customer.id == payload.customer_id).first()
-    if not customer:
-        raise HTTPException(status_code = 404, detail = "Customer not found")
-    for i, item in enumerate(payload.items):
-        if item.quantity <= 0:
-            raise HTTPException(status_code = 400, detail = f"Invalid quantity for item {i}: must be >= 1")
-    order = Order(customer_id = payload.customer_id, status = "pending", total = 0.0)
-    db.add(order)
-    db.flush()
-    try:
-        for item in payload.items:
-            menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
-            if not menu_item:
-                db.rollback()
-                raise HTTPException(status_code = 404, detail = "Menu Item not found")
-            if menu_item.price <= 0:
-                db.rollback()
-                raise HTTPException(status_code = 400, detail=f"Invalid price for menu item {menu_item.id}: must be greater than 0")
-            order_item = OrderItem(quantity = item.quantity, order_id = order.id, menu_item_id = menu_item.id)
-            db.add(order_item)
-        db.commit()
-        db.refresh(order)
-        order.total = utilities.compute_order_total(order, db)
-        db.commit()
-        db.refresh(order)
-        logger.info(f"Order {order.id} created for customer {payload.customer_id}, it costs total {order.total}")
+def create_order(payload: schemas.OrderCreate, response: Response, idempotency_key: Optional[str] = Header(None),
+                 db: Session = Depends(database.get_db)):
+    if idempotency_key:
+        return _create_order_once(payload, idempotency_key, response, db)
+    return _create_order(payload, response, db)
+
+def _create_order_once(payload: schemas.OrderCreate, idempotency_key: str, response: Response, db: Session):
+    #async mode runs handlers on the event loop, where waiting for another request would stall it; concurrent
+    #duplicates there fall through to the unique index instead
+    fingerprint = utilities.payload_fingerprint(payload)
+    state, value = idempotency.orders.begin(idempotency_key, fingerprint, wait = not database.ASYNC_MODE)
+    if state == "mismatch":
+        raise _idempotency_mismatch()
+    if state == "cached":
+        response.headers["Idempotent-Replayed"] = "true"
+        return value
+    if state == "wait":
+        try:
+            result = value.result(timeout = config.IDEMPOTENCY_WAIT_TIMEOUT)
+        except FutureTimeoutError:
+            raise HTTPException(status_code = 409, detail = "A request with this Idempotency-Key is still being processed")
+        response.headers["Idempotent-Replayed"] = "true"
+        return result
+    try:
+        order = _create_order(payload, response, db, idempotency_key)
+        result = schemas.OrderResponse.model_validate(order, from_attributes = True)
+    except Exception as e:
+        idempotency.orders.finish(idempotency_key, fingerprint, value, error = e)
+        raise
+    idempotency.orders.finish(idempotency_key, fingerprint, value, result)
+    return result
+
+def _idempotency_mismatch() -> HTTPException:
+    return HTTPException(status_code = 422, detail = "Idempotency-Key was already used with a different request body")
+
+def _create_order(payload: schemas.OrderCreate, response: Response, db: Session, idempotency_key: Optional[str] = None):
+    try:
+        order = utilities.create_orders([payload], db, idempotency_keys = [idempotency_key])[0]
+        if isinstance(order, HTTPException):
+            raise order
+        _publish("order.created", order)
+        logger.info("Order %s created for customer %s, it costs total %s", order.id, payload.customer_id, order.total,
+                    extra = {"order_id": order.id, "customer_id": payload.customer_id})
 
         return order
     except HTTPException:
         raise
+    except IntegrityError as e:
+        db.rollback()
+        #another worker, or this one before a restart, already created the order for this key
+        existing = db.query(Order.id, Order.idempotency_fingerprint).filter(Order.idempotency_key == idempotency_key).first() if idempotency_key else None
+        if existing is None:
+            logger.error("Error creating order: %s", e)
+            raise HTTPException(status_code = 500, detail = "Internal Server Error")
+        if existing.idempotency_fingerprint not in (None, utilities.payload_fingerprint(payload)):
+            raise _idempotency_mismatch()
+        response.headers["Idempotent-Replayed"] = "true"
+        return utilities.load_orders([existing.id], db)[existing.id]
+    except Exception as e:
+        db.rollback()
+        logger.error("Error creating order: %s", e)
+        raise HTTPException(status_code = 500, detail = "Internal Server Error")
+
+@app.post("/orders/bulk", response_model = list[schemas.BulkOrderResult])
+def create_orders_bulk(payloads: List[schemas.OrderCreate], db: Session = Depends(database.get_db)):
+    try:
+        results = []
+        for i, result in enumerate(utilities.create_orders(payloads, db)):
+            if isinstance(result, HTTPException):
+                results.append({"index": i, "error": {"status_code": result.status_code, "detail": result.detail}})
+            else:
+                _publish("order.created", result)
+                results.append({"index": i, "order": result})
+        created = sum(1 for result in results if "order" in result)
+        logger.info("Bulk order request created %s of %s orders", created, len(payloads), extra = {"count": created})
+
+        return results
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating order: {e}")
+        logger.error("Error creating orders in bulk: %s", e)
         raise HTTPException(status_code = 500, detail = "Internal Server Error")
 
 @app.patch("/orders/{id}/status", response_model = schemas.OrderResponse)
 def update_order_status(id: int, status_update: schemas.StatusUpdate, db: Session = Depends(database.get_db)):
+    if writer.status_queue.running:
+        return _update_order_status_queued(id, status_update, db)
     order = db.query(Order).filter(Order.id == id).first()
     if not order:
         raise HTTPException(status_code = 404, detail = "Order not found")
     try:
-        previous_status = order.status
-        order.status = status_update.status.value
-        db.commit()
-        db.refresh(order)
-        history = OrderHistory(order_id = order.id, previous_status = previous_status, new_status = order.status)
-        db.add(history)
+        previous_status = utilities.set_order_status(order, status_update.status.value, db)
         db.commit()
-        logger.info(f"Order {order.id} status has been updated from {previous_status} to {order.status}")
+        order = utilities.load_orders([id], db)[id]
+        _publish("order.status_changed", order)
+        logger.info("Order %s status has been updated from %s to %s", order.id, previous_status, order.status,
+                    extra = {"order_id": order.id, "order_status": order.status})
         
         return order
     except Exception as e:
         db.rollback()
-        logger.error(f"Error updating status for order {id}: {e}")
+        logger.error("Error updating status for order %s: %s", id, e, extra = {"order_id": id})
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+def _update_order_status_queued(id: int, status_update: schemas.StatusUpdate, db: Session):
+    try:
+        previous_status, new_status = writer.status_queue.submit(id, status_update.status.value).result(timeout = config.STATUS_WRITE_TIMEOUT)
+        order = utilities.load_orders([id], db)[id]
+        _publish("order.status_changed", order)
+        logger.info("Order %s status has been updated from %s to %s", id, previous_status, new_status,
+                    extra = {"order_id": id, "order_status": new_status})
+
+        return order
+    except FutureTimeoutError:
+        #the write stays queued and will most likely still commit, so this must not read as a failure
+        logger.warning("Status update for order %s is still queued after %ss", id, config.STATUS_WRITE_TIMEOUT, extra = {"order_id": id})
+        raise HTTPException(status_code = 504, detail = "Status update is still queued and may yet be applied")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error updating status for order %s: %s", id, e, extra = {"order_id": id})
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@app.patch("/orders/status", response_model = schemas.BulkStatusResult)
+def update_orders_status(status_update: schemas.BulkStatusUpdate, db: Session = Depends(database.get_db)):
+    if status_update.ids is None and status_update.customer_id is None and status_update.table_number is None:
+        raise HTTPException(status_code = 400, detail = "Provide ids, customer_id or table_number to select orders")
+    if utilities.previous_status(status_update.status) is None:
+        raise HTTPException(status_code = 400, detail = f"Orders cannot be moved back to {status_update.status.value}")
+    try:
+        updated = utilities.bulk_set_order_status(status_update.status, db, ids = status_update.ids,
+                                                  customer_id = status_update.customer_id, table_number = status_update.table_number)
+        db.commit()
+        for order_id, customer_id, table_number in db.query(Order.id, Order.customer_id, Customer.table_number).outerjoin(Customer).filter(Order.id.in_(updated)):
+            broadcaster.publish("order.status_changed", order_id, status_update.status.value, customer_id, table_number)
+        skipped = sorted(set(status_update.ids) - set(updated)) if status_update.ids is not None else []
+        logger.info("%s orders moved to %s, %s skipped", len(updated), status_update.status.value, len(skipped),
+                    extra = {"count": len(updated), "order_status": status_update.status.value})
+
+        return {"status": status_update.status, "updated": updated, "skipped": skipped}
+    except Exception as e:
+        db.rollback()
+        logger.error("Error updating status in bulk to %s: %s", status_update.status.value, e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/orders/stream")
+async def stream_order_events(status: Optional[List[schemas.OrderStatus]] = Query(None), table_number: Optional[int] = None,
+                              last_event_id: Optional[int] = Header(None, alias = "Last-Event-ID")):
+    statuses = {s.value for s in status} if status else None
+    events = broadcaster.subscribe(last_event_id, statuses, table_number)
+    return StreamingResponse(events, media_type = "text/event-stream", headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/orders/summary", response_model = schemas.OrderSummary)
+def get_orders_summary(db: Session = Depends(database.get_read_db)):
+    try:
+        return summary.read(db)
+    except Exception as e:
+        logger.error("Error reading orders summary: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/orders/export")
+def export_orders(dataset: schemas.ExportDataset = schemas.ExportDataset.orders, format: schemas.ExportFormat = schemas.ExportFormat.ndjson,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None, db: Session = Depends(database.get_read_db)):
+    if start and end and start >= end:
+        raise HTTPException(status_code = 400, detail = "start must be before end")
+    media_type = "text/csv" if format == schemas.ExportFormat.csv else "application/x-ndjson"
+    logger.info("Exporting %s as %s from %s to %s", dataset.value, format.value, start, end)
+    return utilities.SessionStreamingResponse(export.export(dataset.value, format.value, db, start, end), media_type = media_type,
+                                              headers = {"Content-Disposition": f'attachment; filename="{dataset.value}.{format.value}"'})
+
 @app.get("/orders/{id}", response_model = schemas.OrderResponse)
-def list_order_details(id: int, db: Session = Depends(database.get_db)):
+def list_order_details(id: int, response: Response, if_none_match: Optional[str] = Header(None), db: Session = Depends(database.get_read_db)):
     try:
-        order = db.query(Order).filter(Order.id == id).first()
+        if if_none_match:
+            #answer revalidation from the primary key lookup alone, before loading items
+            current = db.query(Order.version, Order.updated_at).filter(Order.id == id).first()
+            if current and utilities.etag_matches(if_none_match, utilities.order_etag(id, current.version)):
+                return Response(status_code = 304, headers = utilities.cache_headers(utilities.order_etag(id, current.version), current.updated_at))
+        if config.FAST_SERIALIZATION:
+            rows = serializers.order_rows(select(Order.id).where(Order.id == id), db)
+            if rows:
+                order, version, updated_at = rows[0]
+                return Response(content = serializers.order_adapter.dump_json(order), media_type = "application/json",
+                                headers = utilities.cache_headers(utilities.order_etag(id, version), updated_at))
+        #settled orders moved out by the archival job are still served, from the archive tables
+        order = utilities.load_orders([id], db).get(id) or archive.load_archived_order(id, db)
         if not order:
             raise HTTPException(status_code = 404, detail = "Order not found")
-        for item in order.items:
-            if item.menu_item is None:
-                item.menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
-                
+        response.headers.update(utilities.cache_headers(utilities.order_etag(order.id, order.version), order.updated_at))
+
         return order
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching order details for order {id}: {e}")
+        logger.error("Error fetching order details for order %s: %s", id, e, extra = {"order_id": id})
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @app.get("/orders/", response_model = list[schemas.OrderResponse])
-def list_orders(status: Optional[schemas.OrderStatus] = None, db: Session = Depends(database.get_db)):
+def list_orders(response: Response, status: Optional[schemas.OrderStatus] = None,
+                limit: Optional[int] = Query(None, ge = 1, le = MAX_PAGE_SIZE), after: Optional[int] = Query(None, ge = 0),
+                stream: bool = False, if_none_match: Optional[str] = Header(None), db: Session = Depends(database.get_read_db)):
     try:
-        query = db.query(Order)
+        query = db.query(Order).options(selectinload(Order.items).joinedload(OrderItem.menu_item))
         if status:
             query = query.filter(Order.status == status.value)
-        orders = query.all()
-        for order in orders:
-            for item in order.items:
-                if item.menu_item is None:
-                    item.menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
-        
+        query = query.filter(Order.id > (after or 0)).order_by(Order.id)
+        if stream:
+            if limit:
+                query = query.limit(limit)
+            return utilities.SessionStreamingResponse(_ndjson_orders(query.yield_per(STREAM_BATCH_SIZE)), media_type = "application/x-ndjson")
+        limit = limit or DEFAULT_PAGE_SIZE
+        if if_none_match:
+            page = query.with_entities(Order.id, Order.version, Order.updated_at).limit(limit).all()
+            headers = _page_headers(page, limit)
+            if utilities.etag_matches(if_none_match, headers["ETag"]):
+                return Response(status_code = 304, headers = headers)
+        if config.FAST_SERIALIZATION:
+            rows = serializers.order_rows(query.with_entities(Order.id).limit(limit).statement, db)
+            headers = _page_headers([(order["id"], version, updated_at) for order, version, updated_at in rows], limit)
+            return Response(content = serializers.orders_adapter.dump_json([order for order, _, _ in rows]),
+                            media_type = "application/json", headers = headers)
+        orders = query.limit(limit).all()
+        response.headers.update(_page_headers([(order.id, order.version, order.updated_at) for order in orders], limit))
+
         return orders
     except Exception as e:
-        logger.error(f"Error listing orders (status filter: {status}): {e}")
+        logger.error("Error listing orders (status filter: %s): %s", status, e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+def _page_headers(page: list, limit: int) -> dict:
+    #page holds (id, version, updated_at) for each order on the page
+    headers = utilities.cache_headers(utilities.page_etag((order_id, version) for order_id, version, _ in page),
+                                      max((updated_at for _, _, updated_at in page if updated_at), default = None))
+    if len(page) == limit:
+        headers["X-Next-Cursor"] = str(page[-1][0])
+    return headers
+
+def _ndjson_orders(orders):
+    for order in orders:
+        yield schemas.OrderResponse.model_validate(order, from_attributes = True).model_dump_json() + "\n"
+
 @app.delete("/orders/{id}", response_model = dict)
 def delete_order(id: int, db: Session = Depends(database.get_db)):
-    order = db.query(Order).filter(Order.id == id).first()
+    order = db.query(Order).options(joinedload(Order.customer)).filter(Order.id == id).first()
     if not order:
         raise HTTPException(status_code = 404, detail = "Order not found")
     try:
+        customer_id, table_number = order.customer_id, order.customer.table_number if order.customer else None
         db.delete(order)
         db.commit()
-        logger.info(f"Order {id} has been deleted")
+        broadcaster.publish("order.deleted", id, None, customer_id, table_number)
+        logger.info("Order %s has been deleted", id, extra = {"order_id": id})
         
         return {"detail": f"Order {id} has been deleted"}
     except Exception as e:
         db.rollback()
-        logger.error(f"Error deleting order {id}: {e}")
+        logger.error("Error deleting order %s: %s", id, e, extra = {"order_id": id})
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @app.get("/orders/{id}/history", response_model = list[schemas.OrderHistoryResponse])
-def get_order_history(id: int, db: Session = Depends(database.get_db)):
+def get_order_history(id: int, db: Session = Depends(database.get_read_db)):
     try:
         order_history = db.query(OrderHistory).filter(OrderHistory.order_id == id).all()
+        #settled orders moved out by the archival job keep their history in the archive tables
+        if not order_history and db.query(Order.id).filter(Order.id == id).first() is None:
+            order_history = archive.archived_history(id, db)
         if not order_history:
             raise HTTPException(status_code = 404, detail = "Order history not found")
-        logger.info(f"Got {len(order_history)} history records for order {id}")
+        logger.info("Got %s history records for order %s", len(order_history), id, extra = {"order_id": id, "count": len(order_history)})
 
         return order_history
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting history for order {id}: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        logger.error("Error getting history for order %s: %s", id, e, extra = {"order_id": id})
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/customers/{id}/orders", response_model = list[schemas.OrderResponse])
+def get_customer_orders(id: int, include_paid: bool = False, db: Session = Depends(database.get_read_db)):
+    try:
+        if db.get(Customer, id) is None:
+            raise HTTPException(status_code = 404, detail = "Customer not found")
+        ids = [order_id for order_id, _ in utilities.open_order_totals(db, customer_id = id, include_paid = include_paid)]
+        orders = utilities.load_orders(ids, db)
+        logger.info("Got %s orders for customer %s", len(ids), id, extra = {"customer_id": id, "count": len(ids)})
+
+        return [orders[order_id] for order_id in ids]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error listing orders for customer %s: %s", id, e, extra = {"customer_id": id})
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/tables/{table_number}/bill", response_model = schemas.TableBill)
+def get_table_bill(table_number: int, db: Session = Depends(database.get_read_db)):
+    try:
+        totals = utilities.open_order_totals(db, table_number = table_number)
+        orders = utilities.load_orders([order_id for order_id, _ in totals], db)
+
+        return {"table_number": table_number, "orders": [orders[order_id] for order_id, _ in totals], "order_count": len(totals),
+                "total": sum(utilities.to_cents(total) for _, total in totals) / 100}
+    except Exception as e:
+        logger.error("Error building bill for table %s: %s", table_number, e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.post("/tables/{table_number}/pay", response_model = schemas.TablePayment)
+def pay_table(table_number: int, db: Session = Depends(database.get_db)):
+    try:
+        paid = utilities.settle_table(table_number, db)
+        if not paid:
+            raise HTTPException(status_code = 404, detail = f"No open orders at table {table_number}")
+        db.commit()
+        total_cents = 0
+        for order_id, customer_id, total in db.query(Order.id, Order.customer_id, Order.total).filter(Order.id.in_(paid)):
+            broadcaster.publish("order.status_changed", order_id, schemas.OrderStatus.paid.value, customer_id, table_number)
+            total_cents += utilities.to_cents(total)
+        logger.info("Table %s paid %s orders, total %s", table_number, len(paid), total_cents / 100, extra = {"count": len(paid)})
+
+        return {"table_number": table_number, "paid": paid, "total": total_cents / 100}
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error("Error paying table %s: %s", table_number, e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+if database.ASYNC_MODE:
+    async_routes.install(app)
@@ -0,0 +1,162 @@
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.labels, labels), value) for labels, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount = -amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._values.setdefault(labels, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, *labels) -> int:
+        return self._values.get(labels, {"count": 0})["count"]
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, series in self._values.items():
+                for bound, count in zip(self.buckets + ("+Inf",), series["buckets"] + [series["count"]]):
+                    samples.append((f"{self.name}_bucket", _format_labels(self.labels + ("le",), labels + (bound,)), count))
+                samples.append((f"{self.name}_sum", _format_labels(self.labels, labels), series["sum"]))
+                samples.append((f"{self.name}_count", _format_labels(self.labels, labels), series["count"]))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, help: str, collect):
+        #collect() returns the current value of a gauge owned by another component, read at scrape time
+        self.collectors.append((name, help, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{name}{labels} {value}" for name, labels, value in metric.samples()]
+        for name, help, collect in self.collectors:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {collect()}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+requests_total = registry.register(Counter("http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")))
+request_duration = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+requests_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being handled", ("method", "route")))
+request_statements = registry.register(Histogram("db_statements_per_request", "SQL statements issued per HTTP request", ("method", "route"), COUNT_BUCKETS))
+request_db_time = registry.register(Histogram("db_time_per_request_seconds", "Time spent executing SQL per HTTP request", ("method", "route")))
+statement_duration = registry.register(Histogram("db_statement_duration_seconds", "SQL statement execution time"))
+checkout_wait = registry.register(Histogram("db_connection_checkout_wait_seconds", "Time spent waiting for a pooled connection"))
+commit_duration = registry.register(Histogram("db_commit_duration_seconds", "Session commit latency, including the final flush"))
+admission_wait = registry.register(Histogram("admission_queue_wait_seconds", "Time requests waited for an admission slot", ("class",)))
+admission_shed = registry.register(Counter("admission_shed_total", "Requests turned away with 503 by admission control", ("class", "reason")))
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+
+current_request = ContextVar("current_request", default = None)
+
+#the start time lives on the execution context, which is discarded with the statement, so a statement that
+#raises (and never reaches after_cursor_execute) leaves nothing behind on the pooled connection
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    statement_duration.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        commit_duration.observe(time.perf_counter() - started)
+
+def instrument_pool(engine: Engine):
+    #the pool has no "checkout started" event, so time its connect() directly
+    connect = engine.pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            checkout_wait.observe(time.perf_counter() - started)
+
+    engine.pool.connect = timed_connect
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float,ForeignKey, Boolean, DateTime
+from sqlalchemy import Column, String, Integer, Float,ForeignKey, Boolean, DateTime, Index, insert_sentinel
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import enum
@@ -9,7 +9,7 @@ Base = declarative_base()
 class Customer(Base):
     __tablename__ = "customers"
     id = Column(Integer, primary_key = True, index = True)
-    table_number = Column(Integer, nullable = False)
+    table_number = Column(Integer, nullable = False, index = True)
     is_present = Column(Boolean, nullable = False)
     orders = relationship("Order", back_populates = "customer", cascade = "all, delete-orphan")
 
@@ -19,9 +19,32 @@ class Order(Base):
     customer_id = Column(Integer, ForeignKey("customers.id"))
     status = Column(String, default = "pending", nullable = False)
     total = Column(Float, nullable = False)
+    #bumped by every write to the order; together with the id it is the order's ETag
+    version = Column(Integer, nullable = False, default = 1, server_default = "1")
+    updated_at = Column(DateTime, default = datetime.utcnow, onupdate = datetime.utcnow)
+    created_at = Column(DateTime, default = datetime.utcnow)
+    #set when upgrade_db had to estimate created_at for an order that predates the column
+    created_at_inferred = Column(Boolean, nullable = False, default = False, server_default = "0")
+    #client supplied Idempotency-Key of the POST that created the order; NULLs do not collide
+    idempotency_key = Column(String, nullable = True)
+    #sha256 of that request's body, so the key cannot be replayed with a different order
+    idempotency_fingerprint = Column(String, nullable = True)
     customer = relationship("Customer", back_populates = "orders")
     items = relationship("OrderItem", back_populates = "order", cascade = "all, delete-orphan")
     history = relationship("OrderHistory", back_populates = "order", cascade = "all, delete-orphan")
+    #lets SQLite match RETURNING rows to parameters, so many new orders flush as one multi-row INSERT
+    _sentinel = insert_sentinel("insert_sentinel")
+    __table_args__ = (
+        #(status, id) serves both the status filter and the keyset ORDER BY id of list_orders
+        Index("ix_orders_status_id", "status", "id"),
+        #covers customer and table lookups, including the bill total, without touching the table rows
+        Index("ix_orders_customer_id_status", "customer_id", "status", "id", "total"),
+        Index("ix_orders_idempotency_key", "idempotency_key", unique = True),
+        #time-range exports seek on created_at and stream in this order
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        #AUTOINCREMENT keeps ids of archived orders from being handed out again
+        {"sqlite_autoincrement": True},
+    )
 
 class MenuItem(Base):
     __tablename__ = "menu_items"
@@ -34,11 +57,19 @@ class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key = True, index = True)
     quantity = Column(Integer, nullable = False)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index = True)
     menu_item_id = Column(Integer, ForeignKey("menu_items.id"))
+    #menu price at the time the order was placed, in integer cents
+    unit_price_cents = Column(Integer, nullable = True)
+    _sentinel = insert_sentinel("insert_sentinel")
+    __table_args__ = {"sqlite_autoincrement": True}
     order = relationship("Order", back_populates = "items")
     menu_item = relationship("MenuItem", back_populates = "order_items")
 
+    @property
+    def unit_price(self):
+        return self.unit_price_cents / 100 if self.unit_price_cents is not None else None
+
 class OrderHistory(Base):
     __tablename__ = "order_history"
     id = Column(Integer, primary_key = True, index = True)
@@ -46,4 +77,62 @@ class OrderHistory(Base):
     previous_status = Column(String, nullable = False)
     new_status = Column(String, nullable = False)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    order = relationship("Order", back_populates = "history")
\ No newline at end of file
+    __table_args__ = (
+        #serves both per-order history lookups and the stages export's pass over each order's transitions
+        Index("ix_order_history_order_id_timestamp", "order_id", "timestamp"),
+        #the history export seeks on timestamp and streams in this order
+        Index("ix_order_history_timestamp", "timestamp"),
+        {"sqlite_autoincrement": True},
+    )
+    order = relationship("Order", back_populates = "history")
+
+class CatalogVersion(Base):
+    __tablename__ = "catalog_version"
+    id = Column(Integer, primary_key = True)
+    version = Column(Integer, nullable = False, default = 0)
+
+class OrderStatusSummary(Base):
+    __tablename__ = "order_status_summary"
+    status = Column(String, primary_key = True)
+    order_count = Column(Integer, nullable = False, default = 0)
+    total_cents = Column(Integer, nullable = False, default = 0)
+
+
+#settled orders moved out of the hot tables by the archival job; same columns, so rows copy across with INSERT ... SELECT
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+    id = Column(Integer, primary_key = True)
+    customer_id = Column(Integer, index = True)
+    status = Column(String, nullable = False)
+    total = Column(Float, nullable = False)
+    version = Column(Integer, nullable = False, default = 1, server_default = "1")
+    updated_at = Column(DateTime)
+    created_at = Column(DateTime)
+    created_at_inferred = Column(Boolean, nullable = False, default = False, server_default = "0")
+    archived_at = Column(DateTime, default = datetime.utcnow)
+    items = relationship("ArchivedOrderItem", primaryjoin = "ArchivedOrder.id == foreign(ArchivedOrderItem.order_id)", viewonly = True)
+    history = relationship("ArchivedOrderHistory", primaryjoin = "ArchivedOrder.id == foreign(ArchivedOrderHistory.order_id)", viewonly = True)
+    __table_args__ = (Index("ix_archived_orders_created_at_id", "created_at", "id"),)
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "archived_order_items"
+    id = Column(Integer, primary_key = True)
+    quantity = Column(Integer, nullable = False)
+    order_id = Column(Integer, index = True)
+    menu_item_id = Column(Integer)
+    unit_price_cents = Column(Integer, nullable = True)
+    menu_item = relationship("MenuItem", primaryjoin = "MenuItem.id == foreign(ArchivedOrderItem.menu_item_id)", viewonly = True)
+
+    @property
+    def unit_price(self):
+        return self.unit_price_cents / 100 if self.unit_price_cents is not None else None
+
+class ArchivedOrderHistory(Base):
+    __tablename__ = "archived_order_history"
+    id = Column(Integer, primary_key = True)
+    order_id = Column(Integer, nullable = False)
+    previous_status = Column(String, nullable = False)
+    new_status = Column(String, nullable = False)
+    timestamp = Column(DateTime)
+    __table_args__ = (Index("ix_archived_order_history_order_id_timestamp", "order_id", "timestamp"),
+                      Index("ix_archived_order_history_timestamp", "timestamp"))
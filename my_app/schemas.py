@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import Enum
 from datetime import datetime
 
@@ -21,6 +21,7 @@ class OrderItemCreate(BaseModel):
 class OrderItemResponse(BaseModel):
     id: int
     quantity: int
+    unit_price: Optional[float] = None
     menu_item: Optional[MenuItemResponse] = None
     class Config:
         orm_mode = True
@@ -32,6 +33,16 @@ class OrderStatus(str, Enum):
     served = "served"
     paid = "paid"
 
+class ExportDataset(str, Enum):
+    orders = "orders"
+    items = "items"
+    history = "history"
+    stages = "stages"
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
 class OrderCreate(BaseModel):
     customer_id: int
     items: List[OrderItemCreate]
@@ -45,9 +56,45 @@ class OrderResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class TableBill(BaseModel):
+    table_number: int
+    orders: List[OrderResponse]
+    order_count: int
+    total: float
+
+class TablePayment(BaseModel):
+    table_number: int
+    paid: List[int]
+    total: float
+
+class OrderError(BaseModel):
+    status_code: int
+    detail: str
+
+class BulkOrderResult(BaseModel):
+    index: int
+    order: Optional[OrderResponse] = None
+    error: Optional[OrderError] = None
+
 class StatusUpdate(BaseModel):
     status: OrderStatus
 
+class BulkStatusUpdate(BaseModel):
+    status: OrderStatus
+    ids: Optional[List[int]] = None
+    customer_id: Optional[int] = None
+    table_number: Optional[int] = None
+
+class BulkStatusResult(BaseModel):
+    status: OrderStatus
+    updated: List[int]
+    skipped: List[int] = []
+
+class OrderSummary(BaseModel):
+    counts: Dict[OrderStatus, int]
+    open_orders: int
+    open_revenue: float
+
 class OrderHistoryResponse(BaseModel):
     id: int
     order_id: int
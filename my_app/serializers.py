@@ -0,0 +1,51 @@
+from typing import List, Optional
+from typing_extensions import TypedDict
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from my_app.models import MenuItem, Order, OrderItem
+
+#plain-dict mirrors of schemas.OrderResponse: same fields in the same order, so the compiled
+#serializer writes the bytes FastAPI's response_model path would, without validating ORM objects
+class MenuItemRow(TypedDict):
+    id: int
+    name: str
+    price: float
+
+class OrderItemRow(TypedDict):
+    id: int
+    quantity: int
+    unit_price: Optional[float]
+    menu_item: Optional[MenuItemRow]
+
+class OrderRow(TypedDict):
+    id: int
+    customer_id: int
+    status: str
+    total: float
+    items: List[OrderItemRow]
+
+order_adapter = TypeAdapter(OrderRow)
+orders_adapter = TypeAdapter(List[OrderRow])
+
+def order_rows(page, db: Session) -> list:
+    #page is a select of order ids; one flat join fetches every column the response needs as tuples
+    page = page.subquery()
+    statement = (select(Order.id, Order.customer_id, Order.status, Order.total, Order.version, Order.updated_at,
+                        OrderItem.id, OrderItem.quantity, OrderItem.unit_price_cents, MenuItem.id, MenuItem.name, MenuItem.price)
+                 .join(page, page.c.id == Order.id)
+                 .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+                 .outerjoin(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+                 .order_by(Order.id, OrderItem.id))
+    orders = []
+    current = None
+    for (order_id, customer_id, status, total, version, updated_at,
+         item_id, quantity, unit_price_cents, menu_item_id, name, price) in db.execute(statement):
+        if current is None or current[0]["id"] != order_id:
+            current = ({"id": order_id, "customer_id": customer_id, "status": status, "total": total, "items": []}, version, updated_at)
+            orders.append(current)
+        if item_id is not None:
+            current[0]["items"].append({"id": item_id, "quantity": quantity,
+                                        "unit_price": unit_price_cents / 100 if unit_price_cents is not None else None,
+                                        "menu_item": {"id": menu_item_id, "name": name, "price": price} if menu_item_id is not None else None})
+    return orders
@@ -0,0 +1,68 @@
+from sqlalchemy import Integer, cast, func, select, text
+from sqlalchemy.orm import Session
+from my_app import schemas
+from my_app.models import Order, OrderStatusSummary
+
+#triggers keep order_status_summary in step with every write to orders, inside the writing transaction,
+#whether it comes from the ORM, a bulk UPDATE or a raw SQL script
+TRIGGERS = {
+    "order_summary_insert": """
+        CREATE TRIGGER order_summary_insert AFTER INSERT ON orders BEGIN
+            INSERT OR IGNORE INTO order_status_summary (status, order_count, total_cents) VALUES (NEW.status, 0, 0);
+            UPDATE order_status_summary SET order_count = order_count + 1, total_cents = total_cents + CAST(ROUND(NEW.total * 100) AS INTEGER)
+            WHERE status = NEW.status;
+        END""",
+    "order_summary_update": """
+        CREATE TRIGGER order_summary_update AFTER UPDATE OF status, total ON orders BEGIN
+            UPDATE order_status_summary SET order_count = order_count - 1, total_cents = total_cents - CAST(ROUND(OLD.total * 100) AS INTEGER)
+            WHERE status = OLD.status;
+            INSERT OR IGNORE INTO order_status_summary (status, order_count, total_cents) VALUES (NEW.status, 0, 0);
+            UPDATE order_status_summary SET order_count = order_count + 1, total_cents = total_cents + CAST(ROUND(NEW.total * 100) AS INTEGER)
+            WHERE status = NEW.status;
+        END""",
+    "order_summary_delete": """
+        CREATE TRIGGER order_summary_delete AFTER DELETE ON orders BEGIN
+            UPDATE order_status_summary SET order_count = order_count - 1, total_cents = total_cents - CAST(ROUND(OLD.total * 100) AS INTEGER)
+            WHERE status = OLD.status;
+        END""",
+}
+
+def install(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    existing = set(connection.scalars(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")))
+    missing = [name for name in TRIGGERS if name not in existing]
+    for name in missing:
+        connection.execute(text(TRIGGERS[name]))
+    if missing:
+        rebuild(connection)
+
+def _recomputed():
+    return (select(Order.status, func.count(Order.id), func.sum(cast(func.round(Order.total * 100), Integer)))
+            .group_by(Order.status))
+
+def rebuild(connection):
+    connection.execute(OrderStatusSummary.__table__.delete())
+    rows = [{"status": status, "order_count": count, "total_cents": total_cents or 0} for status, count, total_cents in connection.execute(_recomputed())]
+    if rows:
+        connection.execute(OrderStatusSummary.__table__.insert(), rows)
+
+def read(db: Session) -> dict:
+    rows = {row.status: row for row in db.query(OrderStatusSummary)}
+    counts = {status.value: rows[status.value].order_count if status.value in rows else 0 for status in schemas.OrderStatus}
+    open_rows = [row for status, row in rows.items() if status != schemas.OrderStatus.paid.value]
+    return {"counts": counts, "open_orders": sum(row.order_count for row in open_rows),
+            "open_revenue": sum(row.total_cents for row in open_rows) / 100}
+
+def check(db: Session) -> list:
+    #recomputes the counters from the orders table and lists every status whose stored value drifted
+    stored = {row.status: (row.order_count, row.total_cents) for row in db.query(OrderStatusSummary)}
+    actual = {status: (count, total_cents or 0) for status, count, total_cents in db.execute(_recomputed())}
+    drift = []
+    for status in sorted(set(stored) | set(actual)):
+        expected = actual.get(status, (0, 0))
+        found = stored.get(status, (0, 0))
+        if expected != found:
+            drift.append({"status": status, "order_count": found[0], "expected_order_count": expected[0],
+                          "total_cents": found[1], "expected_total_cents": expected[1]})
+    return drift
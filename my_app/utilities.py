@@ -1,14 +1,181 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from my_app import database
-from my_app.models import Order, OrderItem, MenuItem
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Integer, and_, case, cast, func, insert, or_, select, update
+from sqlalchemy.orm import Session, selectinload, joinedload
+from typing import List, Union
+from my_app import database, schemas
+from my_app.catalog import catalog
+from my_app.models import Customer, Order, OrderItem, MenuItem, OrderHistory
+
+class SessionStreamingResponse(StreamingResponse):
+    #keeps the sync iterator around so async mode can drive it through the session instead of a thread
+    def __init__(self, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.content = content
+
+def to_cents(price: float) -> int:
+    return int(round(price * 100))
 
 def compute_order_total(order: Order, db: Session) -> float:
-    total = 0.0
-    for item in order.items:
-        if item.menu_item is None:
-            item.menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
-        if item.menu_item is None:
-            raise HTTPException(status_code=404, detail=f"Menu item {item.menu_item_id} not found")
-        total += item.quantity * item.menu_item.price
-    return round(total, 2)
\ No newline at end of file
+    #one aggregate over the order's items; rows from before price snapshots fall back to the current menu price
+    menu_price_cents = cast(func.round(MenuItem.price * 100), Integer)
+    unpriced = and_(OrderItem.unit_price_cents.is_(None), MenuItem.id.is_(None))
+    total_cents, missing_menu_item_id = db.execute(
+        select(func.sum(OrderItem.quantity * func.coalesce(OrderItem.unit_price_cents, menu_price_cents)),
+               func.min(case((unpriced, OrderItem.menu_item_id))))
+        .select_from(OrderItem).outerjoin(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+        .where(OrderItem.order_id == order.id)).one()
+    if missing_menu_item_id is not None:
+        raise HTTPException(status_code=404, detail=f"Menu item {missing_menu_item_id} not found")
+    return (total_cents or 0) / 100
+
+def backfill_price_snapshots(db: Session) -> int:
+    menu_price_cents = select(cast(func.round(MenuItem.price * 100), Integer)).where(MenuItem.id == OrderItem.menu_item_id).scalar_subquery()
+    result = db.execute(update(OrderItem).where(OrderItem.unit_price_cents.is_(None)).values(unit_price_cents = menu_price_cents)
+                        .execution_options(synchronize_session = False))
+    return result.rowcount
+
+def verify_order_totals(db: Session) -> list:
+    #orders whose stored total disagrees with the sum of their item snapshots, or that still have unpriced items
+    items = (select(OrderItem.order_id, func.sum(OrderItem.quantity * OrderItem.unit_price_cents).label("total_cents"),
+                    func.count(case((OrderItem.unit_price_cents.is_(None), 1))).label("unpriced"))
+             .group_by(OrderItem.order_id).subquery())
+    rows = db.execute(select(Order.id, Order.total, items.c.total_cents, items.c.unpriced)
+                      .join(items, items.c.order_id == Order.id)
+                      .where(or_(items.c.unpriced > 0, func.round(Order.total * 100) != items.c.total_cents))
+                      .order_by(Order.id))
+    return [{"order_id": order_id, "total": total, "items_total": None if unpriced else total_cents / 100}
+            for order_id, total, total_cents, unpriced in rows]
+
+def set_order_status(order: Order, status: str, db: Session) -> str:
+    #the status change and its history row are flushed together, so they commit atomically
+    previous_status = order.status
+    order.status = status
+    order.version = Order.version + 1
+    db.add(OrderHistory(order_id = order.id, previous_status = previous_status, new_status = status))
+    return previous_status
+
+def previous_status(status: schemas.OrderStatus) -> Union[schemas.OrderStatus, None]:
+    flow = list(schemas.OrderStatus)
+    position = flow.index(status)
+    return flow[position - 1] if position > 0 else None
+
+def bulk_set_order_status(status: schemas.OrderStatus, db: Session, ids: List[int] = None,
+                          customer_id: int = None, table_number: int = None) -> List[int]:
+    #only orders one step behind the target move, so the pending -> ... -> paid flow is enforced in the
+    #UPDATE's WHERE clause and every history row's previous status is known without reading the orders
+    previous = previous_status(status)
+    statement = update(Order).where(Order.status == previous.value)
+    if ids is not None:
+        statement = statement.where(Order.id.in_(ids))
+    if customer_id is not None:
+        statement = statement.where(Order.customer_id == customer_id)
+    if table_number is not None:
+        statement = statement.where(Order.customer_id.in_(select(Customer.id).where(Customer.table_number == table_number)))
+    statement = statement.values(status = status.value, version = Order.version + 1).returning(Order.id).execution_options(synchronize_session = False)
+    updated = sorted(db.scalars(statement))
+    if updated:
+        db.execute(insert(OrderHistory), [{"order_id": order_id, "previous_status": previous.value, "new_status": status.value}
+                                          for order_id in updated])
+    return updated
+
+OPEN_STATUSES = [status.value for status in schemas.OrderStatus if status != schemas.OrderStatus.paid]
+
+def open_order_totals(db: Session, customer_id: int = None, table_number: int = None, include_paid: bool = False) -> List[tuple]:
+    #(id, total) pairs read from the (customer_id, status, id, total) index alone; callers sort, so no ORDER BY forces a temp sort
+    query = db.query(Order.id, Order.total)
+    if customer_id is not None:
+        query = query.filter(Order.customer_id == customer_id)
+    if table_number is not None:
+        query = query.filter(Order.customer_id.in_(select(Customer.id).where(Customer.table_number == table_number)))
+    if not include_paid:
+        query = query.filter(Order.status.in_(OPEN_STATUSES))
+    return sorted(query.all())
+
+def settle_table(table_number: int, db: Session) -> List[int]:
+    #moves every served order at the table to paid in the caller's transaction; a table with orders still in the
+    #kitchen cannot be paid, and the check runs after the UPDATE so it sees the same write-locked state
+    paid = bulk_set_order_status(schemas.OrderStatus.paid, db, table_number = table_number)
+    unserved = [order_id for order_id, _ in open_order_totals(db, table_number = table_number)]
+    if unserved:
+        raise HTTPException(status_code = 409, detail = f"Orders {unserved} at table {table_number} have not been served yet")
+    return paid
+
+def order_etag(order_id: int, version: int) -> str:
+    return f'"{order_id}-{version}"'
+
+def page_etag(rows) -> str:
+    #rows are (id, version) pairs; any write, insert or delete inside the page changes the tag
+    digest = hashlib.sha1(",".join(f"{order_id}-{version}" for order_id, version in rows).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Union[str, None], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+def cache_headers(etag: str, updated_at: Union[datetime, None]) -> dict:
+    headers = {"ETag": etag}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo = timezone.utc), usegmt = True)
+    return headers
+
+def _validate_order(payload: schemas.OrderCreate, customer_ids: set, menu_items: dict) -> Union[HTTPException, None]:
+    if payload.customer_id not in customer_ids:
+        return HTTPException(status_code = 404, detail = "Customer not found")
+    for i, item in enumerate(payload.items):
+        if item.quantity <= 0:
+            return HTTPException(status_code = 400, detail = f"Invalid quantity for item {i}: must be >= 1")
+    for item in payload.items:
+        menu_item = menu_items.get(item.menu_item_id)
+        if not menu_item:
+            return HTTPException(status_code = 404, detail = "Menu Item not found")
+        if menu_item.price <= 0:
+            return HTTPException(status_code = 400, detail = f"Invalid price for menu item {menu_item.id}: must be greater than 0")
+    return None
+
+def load_orders(ids: List[int], db: Session) -> dict:
+    if not ids:
+        return {}
+    orders = db.query(Order).options(selectinload(Order.items).joinedload(OrderItem.menu_item), joinedload(Order.customer)).filter(Order.id.in_(ids)).all()
+    return {order.id: order for order in orders}
+
+def payload_fingerprint(payload: schemas.OrderCreate) -> str:
+    #ties an Idempotency-Key to the body it was first sent with
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+def create_orders(payloads: List[schemas.OrderCreate], db: Session, idempotency_keys: List[Union[str, None]] = None) -> List[Union[Order, HTTPException]]:
+    #one IN (...) lookup per referenced table, whatever the number of orders and items
+    customer_ids = {payload.customer_id for payload in payloads}
+    menu_item_ids = {item.menu_item_id for payload in payloads for item in payload.items}
+    known_customers = set(db.scalars(select(Customer.id).where(Customer.id.in_(customer_ids)))) if customer_ids else set()
+    menu_items = catalog.get_many(menu_item_ids, db)
+
+    results = []
+    new_orders = []
+    for payload, idempotency_key in zip(payloads, idempotency_keys or [None] * len(payloads)):
+        error = _validate_order(payload, known_customers, menu_items)
+        if error:
+            results.append(error)
+            continue
+        items = [OrderItem(quantity = item.quantity, menu_item_id = item.menu_item_id, unit_price_cents = to_cents(menu_items[item.menu_item_id].price))
+                 for item in payload.items]
+        total_cents = sum(item.quantity * item.unit_price_cents for item in items)
+        order = Order(customer_id = payload.customer_id, status = "pending", total = total_cents / 100, items = items, idempotency_key = idempotency_key,
+                      idempotency_fingerprint = payload_fingerprint(payload) if idempotency_key else None)
+        new_orders.append(order)
+        results.append(order)
+    if not new_orders:
+        return results
+
+    #orders and items go out as batched inserts, all in a single transaction
+    db.add_all(new_orders)
+    db.flush()
+    ids = {id(order): order.id for order in new_orders}
+    db.commit()
+    loaded = load_orders(list(ids.values()), db)
+    return [result if isinstance(result, HTTPException) else loaded[ids[id(result)]] for result in results]
@@ -0,0 +1,106 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from fastapi import HTTPException
+from my_app import config, database, utilities
+from my_app.models import Order
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class StatusWriteQueue:
+    #status changes from many requests are drained by one writer thread and committed together,
+    #so a burst of ticket bumps costs one write transaction instead of one per request
+    def __init__(self, session_factory, max_batch: int = 100, max_depth: int = 10000):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self.rejected = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self._queue = queue.Queue(maxsize = max_depth)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.running:
+            self._thread = threading.Thread(target = self._run, name = "status-writer", daemon = True)
+            self._thread.start()
+
+    def stop(self):
+        if self.running:
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+
+    def submit(self, order_id: int, status: str) -> Future:
+        #a full queue means the writer is far behind; waiting for room would only hold the request thread longer
+        future = Future()
+        try:
+            self._queue.put_nowait((order_id, status, future))
+        except queue.Full:
+            self.rejected += 1
+            raise HTTPException(status_code = 503, detail = "Status update queue is full, retry later", headers = {"Retry-After": "1"})
+        return future
+
+    def stats(self) -> dict:
+        return {"depth": self._queue.qsize(), "batches": self.batches, "writes": self.writes, "rejected": self.rejected,
+                "last_batch_size": self.last_batch_size, "max_batch_size": self.max_batch_size}
+
+    def _run(self):
+        while True:
+            write = self._queue.get()
+            if write is _STOP:
+                return
+            batch = [write]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    write = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if write is _STOP:
+                    stop = True
+                    break
+                batch.append(write)
+            self._apply(batch)
+            if stop:
+                return
+
+    def _apply(self, batch: list):
+        results = []
+        db = self.session_factory()
+        try:
+            ids = {order_id for order_id, _, _ in batch}
+            orders = {order.id: order for order in db.query(Order).filter(Order.id.in_(ids))}
+            for order_id, status, _ in batch:
+                order = orders.get(order_id)
+                if not order:
+                    results.append(HTTPException(status_code = 404, detail = "Order not found"))
+                    continue
+                previous_status = utilities.set_order_status(order, status, db)
+                results.append((previous_status, status))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error("Error applying batch of %s status updates: %s", len(batch), e, extra = {"count": len(batch)})
+            results = [e] * len(batch)
+        finally:
+            db.close()
+        self.batches += 1
+        self.writes += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        for (_, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+status_queue = StatusWriteQueue(database.SessionLocal, config.STATUS_WRITE_MAX_BATCH, config.STATUS_WRITE_MAX_DEPTH)
@@ -4,20 +4,24 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
-from my_app.models import Base, Customer, MenuItem, Order, OrderItem
+from my_app.models import Customer, MenuItem, Order, OrderItem, OrderHistory, ArchivedOrder, ArchivedOrderItem, ArchivedOrderHistory
 from my_app.main import app
-from my_app.database import get_db
+from my_app.database import get_db, get_read_db, init_db
 
 load_dotenv()
 TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite:///./test.db")
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-Base.metadata.create_all(bind=engine)
+init_db(engine)
 
 @pytest.fixture(scope="function")
 def db_session():
     session = TestingSessionLocal()
     #delete all tables before a new test
+    session.query(ArchivedOrderHistory).delete()
+    session.query(ArchivedOrderItem).delete()
+    session.query(ArchivedOrder).delete()
+    session.query(OrderHistory).delete()
     session.query(OrderItem).delete()
     session.query(Order).delete()
     session.query(MenuItem).delete()
@@ -43,8 +47,10 @@ def client(db_session):
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     with TestClient(app) as tc:
         yield tc
 
     app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_read_db, None)
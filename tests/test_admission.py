@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from my_app import admission, config, metrics
+from my_app.admission import AdmissionLimiter, Shed
+
+def test_limiter_queues_hands_over_and_sheds():
+    async def scenario():
+        limiter = AdmissionLimiter("test", limit = 1, max_queue = 1, timeout = 1)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        with pytest.raises(Shed) as shed:
+            await limiter.acquire()
+        assert shed.value.reason == "queue_full"
+        limiter.release()
+        await waiting
+        assert (limiter.active, limiter.queued) == (1, 0)
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+def test_limiter_sheds_after_deadline():
+    async def scenario():
+        limiter = AdmissionLimiter("test", limit = 1, max_queue = 5, timeout = 0.01)
+        await limiter.acquire()
+        with pytest.raises(Shed) as shed:
+            await limiter.acquire()
+        assert shed.value.reason == "timeout"
+        assert limiter.queued == 0
+        #the slot goes back to the pool rather than to the waiter that gave up
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+def test_full_write_class_is_shed_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_CONTROL", True)
+    monkeypatch.setitem(admission.limiters, "write", AdmissionLimiter("write", limit = 0, max_queue = 0, timeout = 1))
+    shed_before = metrics.admission_shed.value("write", "queue_full")
+
+    response = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(config.ADMISSION_RETRY_AFTER)
+    assert metrics.admission_shed.value("write", "queue_full") == shed_before + 1
+    #reads have their own limit and are unaffected
+    assert client.get("/orders/").status_code == 200
+    assert "admission_shed_total" in client.get("/metrics").text
+
+def test_admitted_requests_release_their_slot(client, monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_CONTROL", True)
+    limiter = AdmissionLimiter("write", limit = 1, max_queue = 0, timeout = 1)
+    monkeypatch.setitem(admission.limiters, "write", limiter)
+    for _ in range(3):
+        assert client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}).status_code == 200
+    assert client.post("/orders/", json = {"customer_id": 999, "items": []}).status_code == 404
+    assert limiter.active == 0
@@ -0,0 +1,96 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from my_app import summary
+from my_app.archive import archive_orders
+from my_app.database import create_engines, init_db
+from my_app.models import ArchivedOrder, ArchivedOrderHistory, Order, OrderHistory, OrderItem
+
+LEGACY_TABLES = [
+    "CREATE TABLE customers (id INTEGER NOT NULL, table_number INTEGER NOT NULL, is_present BOOLEAN NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE menu_items (id INTEGER NOT NULL, name VARCHAR NOT NULL, price FLOAT NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE orders (id INTEGER NOT NULL, customer_id INTEGER, status VARCHAR NOT NULL, total FLOAT NOT NULL, "
+    "PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES customers (id))",
+    "CREATE TABLE order_items (id INTEGER NOT NULL, quantity INTEGER NOT NULL, order_id INTEGER, menu_item_id INTEGER, "
+    "PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES orders (id), FOREIGN KEY(menu_item_id) REFERENCES menu_items (id))",
+    "CREATE TABLE order_history (id INTEGER NOT NULL, order_id INTEGER NOT NULL, previous_status VARCHAR NOT NULL, "
+    "new_status VARCHAR NOT NULL, timestamp DATETIME, PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES orders (id))",
+]
+
+def _paid_orders(client, count):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}, {"menu_item_id": 2, "quantity": 2}]} for _ in range(count)]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+    for status in ("preparing", "ready", "served", "paid"):
+        client.patch("/orders/status", json = {"ids": order_ids, "status": status})
+    return order_ids
+
+def test_archive_moves_settled_orders_and_reads_fall_back(client, db_session):
+    open_order = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}).json()["id"]
+    order_ids = _paid_orders(client, 2)
+    before = client.get(f"/orders/{order_ids[0]}").json()
+
+    assert archive_orders(db_session, datetime.utcnow() + timedelta(seconds = 1)) == 2
+    assert db_session.query(Order).filter(Order.id.in_(order_ids)).count() == 0
+    assert db_session.query(OrderItem).filter(OrderItem.order_id.in_(order_ids)).count() == 0
+    assert db_session.query(OrderHistory).filter(OrderHistory.order_id.in_(order_ids)).count() == 0
+    assert db_session.get(Order, open_order) is not None
+
+    response = client.get(f"/orders/{order_ids[0]}")
+    assert response.status_code == 200, response.text
+    assert response.json() == before
+    response = client.get(f"/orders/{order_ids[0]}/history")
+    assert response.status_code == 200, response.text
+    assert [h["new_status"] for h in response.json()] == ["preparing", "ready", "served", "paid"]
+    assert client.get("/orders/summary").json()["counts"]["paid"] == 0
+
+def test_archive_respects_retention_window(client, db_session):
+    _paid_orders(client, 1)
+    assert archive_orders(db_session, datetime.utcnow() - timedelta(days = 1)) == 0
+
+def test_archived_ids_are_not_reused(client, db_session):
+    order_ids = _paid_orders(client, 1)
+    archive_orders(db_session, datetime.utcnow() + timedelta(seconds = 1))
+    order_id = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}).json()["id"]
+    assert order_id > order_ids[0]
+    #a hot order without history must not pick up an archived order's
+    db_session.add(ArchivedOrderHistory(order_id = order_id, previous_status = "served", new_status = "paid"))
+    db_session.commit()
+    assert client.get(f"/orders/{order_id}/history").status_code == 404
+
+def test_upgrade_rebuilds_legacy_tables_with_autoincrement(tmp_path):
+    #tables created by the original create_all have no AUTOINCREMENT, so a deleted newest id is handed out again
+    engine, _ = create_engines(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for ddl in LEGACY_TABLES:
+            connection.execute(text(ddl))
+        connection.execute(text("INSERT INTO customers (id, table_number, is_present) VALUES (1, 1, 1)"))
+        connection.execute(text("INSERT INTO menu_items (id, name, price) VALUES (1, 'Espresso', 2.5)"))
+        connection.execute(text("INSERT INTO orders (id, customer_id, status, total) VALUES (1, 1, 'pending', 2.5), (2, 1, 'paid', 2.5), (3, 1, 'pending', 2.5)"))
+        connection.execute(text("INSERT INTO order_items (id, quantity, order_id, menu_item_id) VALUES (1, 1, 1, 1), (2, 1, 2, 1), (3, 1, 3, 1)"))
+        connection.execute(text("INSERT INTO order_history (id, order_id, previous_status, new_status) VALUES (1, 2, 'served', 'paid')"))
+    init_db(engine)
+
+    db = sessionmaker(bind = engine)()
+    try:
+        assert archive_orders(db, datetime.utcnow()) == 1
+        db.delete(db.get(Order, 3))
+        db.commit()
+        order = Order(customer_id = 1, status = "pending", total = 2.5, items = [OrderItem(quantity = 1, menu_item_id = 1)])
+        db.add(order)
+        db.flush()
+        db.add(OrderHistory(order_id = order.id, previous_status = "pending", new_status = "preparing"))
+        db.commit()
+        assert order.id == 4 and order.items[0].id == 4
+        assert db.query(OrderHistory).one().id == 2
+        assert summary.read(db)["counts"]["pending"] == 2
+    finally:
+        db.close()
+
+def test_archive_resumes_in_batches(client, db_session):
+    order_ids = _paid_orders(client, 3)
+    cutoff = datetime.utcnow() + timedelta(seconds = 1)
+
+    assert archive_orders(db_session, cutoff, batch_size = 2, max_batches = 1) == 2
+    assert archive_orders(db_session, cutoff, batch_size = 2) == 1
+    assert sorted(order.id for order in db_session.query(ArchivedOrder)) == order_ids
@@ -0,0 +1,76 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from my_app import async_routes, database
+from my_app.main import app
+from tests.conftest import TEST_DATABASE_URL
+
+@pytest.fixture(scope="function")
+def async_client(client):
+    async_app = FastAPI()
+    async_app.router.routes.extend(app.router.routes)
+    async_routes.install(async_app)
+    async_engine = create_async_engine(TEST_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    async_app.dependency_overrides[database.get_async_db] = override_get_async_db
+    with TestClient(async_app) as tc:
+        yield tc
+
+def test_async_routes_replace_sync_handlers(async_client):
+    route = next(route for route in async_client.app.router.routes if getattr(route, "name", None) == "create_order")
+    assert async_routes.inspect.iscoroutinefunction(route.endpoint)
+
+def test_async_order_lifecycle(async_client):
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}, {"menu_item_id": 2, "quantity": 1}]}
+    response = async_client.post("/orders/", json = payload)
+    assert response.status_code == 200, response.text
+    order_id = response.json()["id"]
+    assert abs(response.json()["total"] - 19.5) < 1e-6
+
+    response = async_client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "preparing"
+
+    response = async_client.get(f"/orders/{order_id}")
+    assert response.status_code == 200, response.text
+    assert len(response.json()["items"]) == 2
+
+    response = async_client.get(f"/orders/{order_id}/history")
+    assert response.status_code == 200, response.text
+    assert response.json()[0]["new_status"] == "preparing"
+
+    response = async_client.get("/orders/9999")
+    assert response.status_code == 404
+
+    response = async_client.delete(f"/orders/{order_id}")
+    assert response.status_code == 200, response.text
+
+def test_async_stream_orders(async_client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]} for _ in range(3)]
+    created_ids = [result["order"]["id"] for result in async_client.post("/orders/bulk", json = payload).json()]
+
+    response = async_client.get("/orders/", params = {"stream": True})
+    assert response.status_code == 200, response.text
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == created_ids
+
+def test_async_idempotent_create(async_client):
+    from my_app import idempotency
+    headers = {"Idempotency-Key": "async-create-key"}
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}
+    first = async_client.post("/orders/", json = payload, headers = headers)
+    assert first.status_code == 200, first.text
+    idempotency.orders.clear()
+    replay = async_client.post("/orders/", json = payload, headers = headers)
+    assert replay.status_code == 200, replay.text
+    assert replay.json()["id"] == first.json()["id"]
+    assert replay.headers["Idempotent-Replayed"] == "true"
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import update
+from my_app.catalog import MenuCatalog
+from my_app.models import CatalogVersion, MenuItem
+
+def test_catalog_read_through_counts_hits_and_misses(db_session):
+    burger = MenuItem(name="Burger", price=8.0)
+    db_session.add(burger)
+    db_session.commit()
+    catalog = MenuCatalog(max_size=10, ttl=60, version_check_interval=60)
+
+    assert catalog.get(burger.id, db_session).price == 8.0
+    assert catalog.get(burger.id, db_session).price == 8.0
+    assert catalog.get(9999, db_session) is None
+    assert catalog.stats()["hits"] == 1
+    assert catalog.stats()["misses"] == 2
+
+def test_catalog_is_bounded(db_session):
+    items = [MenuItem(name=f"Dish {i}", price=1.0 + i) for i in range(5)]
+    db_session.add_all(items)
+    db_session.commit()
+    catalog = MenuCatalog(max_size=3, ttl=60, version_check_interval=60)
+
+    catalog.get_many([item.id for item in items], db_session)
+    assert catalog.stats()["size"] == 3
+
+def test_catalog_expires_entries(db_session):
+    burger = MenuItem(name="Burger", price=8.0)
+    db_session.add(burger)
+    db_session.commit()
+    catalog = MenuCatalog(max_size=10, ttl=0, version_check_interval=60)
+
+    catalog.get(burger.id, db_session)
+    catalog.get(burger.id, db_session)
+    assert catalog.stats()["hits"] == 0
+
+def test_catalog_drops_entries_when_shared_version_changes(db_session):
+    burger = MenuItem(name="Burger", price=8.0)
+    db_session.add(burger)
+    db_session.commit()
+    catalog = MenuCatalog(max_size=10, ttl=60, version_check_interval=0)
+    assert catalog.get(burger.id, db_session).price == 8.0
+
+    #another worker edits the price and bumps the version without touching our process
+    db_session.execute(update(MenuItem).where(MenuItem.id == burger.id).values(price = 9.0).execution_options(synchronize_session = False))
+    db_session.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version = CatalogVersion.version + 1))
+    db_session.commit()
+    assert catalog.get(burger.id, db_session).price == 9.0
+
+def test_menu_item_write_invalidates_shared_catalog(client, db_session):
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}
+    assert client.post("/orders/", json = payload).json()["total"] == 8.5
+
+    menu_item = db_session.get(MenuItem, 1)
+    menu_item.price = 10.0
+    db_session.commit()
+    assert client.post("/orders/", json = payload).json()["total"] == 10.0
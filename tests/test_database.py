@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from benchmarks.stress import run
+from my_app.database import create_engines, init_db
+
+def test_production_profile_pragmas(tmp_path):
+    writer, reader = create_engines(f"sqlite:///{tmp_path / 'orders.db'}", "production", {"busy_timeout": "7000"})
+    init_db(writer)
+    with writer.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 7000
+    assert writer.pool.size() == 1
+    with reader.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA query_only").scalar() == 1
+        with pytest.raises(OperationalError):
+            connection.execute(text("INSERT INTO customers (table_number, is_present) VALUES (1, 1)"))
+
+def test_default_profile_leaves_sqlite_settings(tmp_path):
+    writer, _ = create_engines(f"sqlite:///{tmp_path / 'orders.db'}")
+    with writer.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+
+def test_concurrent_processes_write_without_lock_errors(tmp_path):
+    report = run(f"sqlite:///{tmp_path / 'stress.db'}", "production", processes = 4, writes = 50, rate = 100)
+    assert report["errors"] == 0, report["sample_errors"]
+    assert report["completed"] == 200
@@ -1,5 +1,8 @@
 import pytest
-from my_app.models import MenuItem
+import json
+from sqlalchemy import event
+from my_app import config
+from my_app.models import Customer, MenuItem
 
 def test_create_order_success(client):
     payload = {
@@ -197,4 +200,213 @@ def test_get_order_history_failure(client):
     response = client.get("/orders/9999/history")
     assert response.status_code == 404
     data = response.json()
-    assert "Order history not found" in data["detail"]
\ No newline at end of file
+    assert "Order history not found" in data["detail"]
+
+def test_create_orders_bulk_mixed_results(client, db_session):
+    payload = [
+        {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}]},
+        {"customer_id": 999, "items": [{"menu_item_id": 1, "quantity": 1}]},
+        {"customer_id": 1, "items": [{"menu_item_id": 999, "quantity": 1}]},
+        {"customer_id": 1, "items": [{"menu_item_id": 2, "quantity": 0}]},
+        {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}, {"menu_item_id": 2, "quantity": 3}]}
+    ]
+    inserts = []
+    listener = lambda conn, cursor, statement, parameters, context, executemany: inserts.append(statement) if statement.lstrip().upper().startswith("INSERT") else None
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        response = client.post("/orders/bulk", json = payload)
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert response.status_code == 200, response.text
+    #valid orders and their items go out as one multi-row INSERT each
+    assert len(inserts) == 2, inserts
+    data = response.json()
+    assert [result["index"] for result in data] == [0, 1, 2, 3, 4]
+    assert abs(data[0]["order"]["total"] - 17.0) < 1e-6
+    assert data[1]["error"] == {"status_code": 404, "detail": "Customer not found"}
+    assert data[2]["error"] == {"status_code": 404, "detail": "Menu Item not found"}
+    assert data[3]["error"]["status_code"] == 400 and "Invalid quantity" in data[3]["error"]["detail"]
+    assert abs(data[4]["order"]["total"] - 16.0) < 1e-6
+    assert len(data[4]["order"]["items"]) == 2
+
+    for result in (data[0], data[4]):
+        response = client.get(f"/orders/{result['order']['id']}")
+        assert response.status_code == 200, response.text
+
+def test_list_orders_keyset_pagination(client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]} for _ in range(5)]
+    created_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+
+    response = client.get("/orders/", params = {"limit": 2})
+    assert response.status_code == 200, response.text
+    assert [order["id"] for order in response.json()] == created_ids[:2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    seen = created_ids[:2]
+    while cursor:
+        response = client.get("/orders/", params = {"limit": 2, "after": cursor})
+        assert response.status_code == 200, response.text
+        seen += [order["id"] for order in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+    assert seen == created_ids
+
+def test_list_orders_stream_ndjson(client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}, {"menu_item_id": 2, "quantity": 2}]} for _ in range(3)]
+    created_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+
+    response = client.get("/orders/", params = {"stream": True})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert [order["id"] for order in orders] == created_ids
+    assert all(len(order["items"]) == 2 and order["items"][0]["menu_item"]["name"] for order in orders)
+
+def test_bulk_status_update_by_ids(client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]} for _ in range(3)]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+    client.patch(f"/orders/{order_ids[0]}/status", json = {"status": "preparing"})
+    client.patch(f"/orders/{order_ids[1]}/status", json = {"status": "preparing"})
+
+    response = client.patch("/orders/status", json = {"ids": order_ids, "status": "ready"})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data == {"status": "ready", "updated": order_ids[:2], "skipped": order_ids[2:]}
+    assert client.get(f"/orders/{order_ids[0]}").json()["status"] == "ready"
+    assert client.get(f"/orders/{order_ids[2]}").json()["status"] == "pending"
+    history = client.get(f"/orders/{order_ids[0]}/history").json()
+    assert [(h["previous_status"], h["new_status"]) for h in history] == [("pending", "preparing"), ("preparing", "ready")]
+
+def test_bulk_status_update_by_table(client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]} for _ in range(2)]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+
+    response = client.patch("/orders/status", json = {"table_number": 1, "status": "preparing"})
+    assert response.status_code == 200, response.text
+    assert response.json()["updated"] == order_ids
+
+def test_bulk_status_update_rejects_invalid_requests(client):
+    response = client.patch("/orders/status", json = {"status": "ready"})
+    assert response.status_code == 400, response.text
+    response = client.patch("/orders/status", json = {"ids": [1], "status": "pending"})
+    assert response.status_code == 400, response.text
+
+def test_order_items_keep_price_at_order_time(client, db_session):
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}]}
+    order_id = client.post("/orders/", json = payload).json()["id"]
+    menu_item = db_session.get(MenuItem, 1)
+    menu_item.price = 12.0
+    db_session.commit()
+
+    data = client.get(f"/orders/{order_id}").json()
+    assert data["total"] == 17.0
+    assert data["items"][0]["unit_price"] == 8.5
+
+def test_get_order_conditional_requests(client):
+    order_id = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}).json()["id"]
+    response = client.get(f"/orders/{order_id}")
+    etag = response.headers["ETag"]
+    assert etag == f'"{order_id}-1"'
+    assert "Last-Modified" in response.headers
+
+    response = client.get(f"/orders/{order_id}", headers = {"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+    response = client.get(f"/orders/{order_id}", headers = {"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{order_id}-2"'
+
+    client.patch("/orders/status", json = {"ids": [order_id], "status": "ready"})
+    assert client.get(f"/orders/{order_id}").headers["ETag"] == f'"{order_id}-3"'
+
+def test_list_orders_conditional_requests(client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]} for _ in range(3)]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+    response = client.get("/orders/", params = {"limit": 2})
+    etag = response.headers["ETag"]
+
+    response = client.get("/orders/", params = {"limit": 2}, headers = {"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["X-Next-Cursor"] == str(order_ids[1])
+
+    client.patch(f"/orders/{order_ids[1]}/status", json = {"status": "preparing"})
+    response = client.get("/orders/", params = {"limit": 2}, headers = {"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 2
+
+@pytest.mark.parametrize("path, params", [("/orders/", {"limit": 3}), ("/orders/", {"status": "preparing"}), ("/orders/{id}", {})])
+def test_fast_serialization_matches_response_model(client, db_session, monkeypatch, path, params):
+    menu_item = MenuItem(name = "Crème brûlée \"special\"", price = 6.25)
+    db_session.add(menu_item)
+    db_session.commit()
+    payload = [
+        {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}, {"menu_item_id": menu_item.id, "quantity": 1}]},
+        {"customer_id": 1, "items": [{"menu_item_id": 2, "quantity": 3}]},
+        {"customer_id": 1, "items": [{"menu_item_id": menu_item.id, "quantity": 1}, {"menu_item_id": 2, "quantity": 1}]},
+        {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}
+    ]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+    client.patch("/orders/status", json = {"ids": order_ids[1:], "status": "preparing"})
+    #an item whose menu entry was removed serializes with a null menu_item
+    db_session.delete(db_session.get(MenuItem, 2))
+    db_session.commit()
+    path = path.format(id = order_ids[2])
+
+    monkeypatch.setattr(config, "FAST_SERIALIZATION", False)
+    expected = client.get(path, params = params)
+    monkeypatch.setattr(config, "FAST_SERIALIZATION", True)
+    fast = client.get(path, params = params)
+    assert fast.status_code == expected.status_code == 200
+    assert fast.content == expected.content
+    assert fast.headers["content-type"] == expected.headers["content-type"]
+    assert fast.headers["ETag"] == expected.headers["ETag"]
+    assert fast.headers.get("X-Next-Cursor") == expected.headers.get("X-Next-Cursor")
+
+def _table_orders(client, db_session):
+    #customer 1 sits at table 1 with a second customer; a third customer sits at table 2
+    neighbour, elsewhere = Customer(table_number = 1, is_present = True), Customer(table_number = 2, is_present = True)
+    db_session.add_all([neighbour, elsewhere])
+    db_session.commit()
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]},
+               {"customer_id": neighbour.id, "items": [{"menu_item_id": 2, "quantity": 3}]},
+               {"customer_id": elsewhere.id, "items": [{"menu_item_id": 1, "quantity": 2}]}]
+    return [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()], neighbour.id
+
+def test_customer_orders(client, db_session):
+    order_ids, _ = _table_orders(client, db_session)
+    paid = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 2, "quantity": 1}]}).json()["id"]
+    for status in ("preparing", "ready", "served", "paid"):
+        client.patch(f"/orders/{paid}/status", json = {"status": status})
+
+    response = client.get("/customers/1/orders")
+    assert response.status_code == 200, response.text
+    assert [order["id"] for order in response.json()] == [order_ids[0]]
+    assert response.json()[0]["items"][0]["menu_item"]["name"] == "Margherita Pizza"
+    assert [order["id"] for order in client.get("/customers/1/orders", params = {"include_paid": True}).json()] == [order_ids[0], paid]
+    assert client.get("/customers/999999/orders").status_code == 404
+
+def test_table_bill_and_payment(client, db_session):
+    order_ids, neighbour_id = _table_orders(client, db_session)
+    bill = client.get("/tables/1/bill").json()
+    assert [order["id"] for order in bill["orders"]] == order_ids[:2]
+    assert bill["order_count"] == 2 and bill["total"] == 16.0
+
+    #orders still in the kitchen block payment, and nothing is changed
+    client.patch("/orders/status", json = {"ids": order_ids[:2], "status": "preparing"})
+    response = client.post("/tables/1/pay")
+    assert response.status_code == 409
+    assert {order["status"] for order in client.get("/tables/1/bill").json()["orders"]} == {"preparing"}
+
+    for status in ("ready", "served"):
+        client.patch("/orders/status", json = {"ids": order_ids[:2], "status": status})
+    response = client.post("/tables/1/pay")
+    assert response.status_code == 200, response.text
+    assert response.json() == {"table_number": 1, "paid": order_ids[:2], "total": 16.0}
+    assert client.get("/tables/1/bill").json() == {"table_number": 1, "orders": [], "order_count": 0, "total": 0.0}
+    assert [h["new_status"] for h in client.get(f"/orders/{order_ids[1]}/history").json()][-1] == "paid"
+    assert client.get(f"/customers/{neighbour_id}/orders", params = {"include_paid": True}).json()[0]["status"] == "paid"
+    assert client.get(f"/orders/{order_ids[2]}").json()["status"] == "pending"
+    assert client.post("/tables/1/pay").status_code == 404
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from my_app import events
+from my_app.events import Broadcaster
+
+async def _collect(subscription, count):
+    received = []
+    async for message in subscription:
+        received.append(message)
+        if len(received) == count:
+            break
+    await subscription.aclose()
+    return received
+
+def test_subscribers_receive_filtered_live_events():
+    async def scenario():
+        broadcaster = Broadcaster()
+        subscription = _collect(broadcaster.subscribe(statuses = {"ready"}, table_number = 7), 2)
+        task = asyncio.create_task(subscription)
+        await asyncio.sleep(0)
+        broadcaster.publish("order.status_changed", 1, "ready", 1, 7)
+        broadcaster.publish("order.status_changed", 2, "preparing", 1, 7)
+        broadcaster.publish("order.status_changed", 3, "ready", 2, 3)
+        broadcaster.publish("order.deleted", 4, None, 1, 7)
+        return await asyncio.wait_for(task, 1)
+
+    received = asyncio.run(scenario())
+    assert received[0].startswith("id: 1\nevent: order.status_changed\n")
+    assert received[1].startswith("id: 4\nevent: order.deleted\n")
+
+def test_resume_from_last_event_id_replays_backlog():
+    async def scenario():
+        broadcaster = Broadcaster()
+        for order_id in range(1, 4):
+            broadcaster.publish("order.created", order_id, "pending", 1, 1)
+        return await asyncio.wait_for(_collect(broadcaster.subscribe(last_event_id = 1), 2), 1)
+
+    received = asyncio.run(scenario())
+    assert [message.split("\n")[0] for message in received] == ["id: 2", "id: 3"]
+
+def test_resume_past_buffer_sends_reset():
+    async def scenario():
+        broadcaster = Broadcaster(history = 2)
+        for order_id in range(1, 6):
+            broadcaster.publish("order.created", order_id, "pending", 1, 1)
+        return await asyncio.wait_for(_collect(broadcaster.subscribe(last_event_id = 1), 3), 1)
+
+    received = asyncio.run(scenario())
+    assert received[0].startswith("event: reset\n")
+    assert [message.split("\n")[0] for message in received[1:]] == ["id: 4", "id: 5"]
+
+def test_order_writes_publish_events(client):
+    start = events.broadcaster.last_event_id
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}
+    order_id = client.post("/orders/", json = payload).json()["id"]
+    client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+    client.patch("/orders/status", json = {"ids": [order_id], "status": "ready"})
+    client.delete(f"/orders/{order_id}")
+
+    published, _ = events.broadcaster.since(start)
+    assert [(event.type, event.order_id, event.status, event.table_number) for event in published] == [
+        ("order.created", order_id, "pending", 1),
+        ("order.status_changed", order_id, "preparing", 1),
+        ("order.status_changed", order_id, "ready", 1),
+        ("order.deleted", order_id, None, 1),
+    ]
+
+def test_resume_from_unknown_future_id_sends_reset():
+    #a client reconnecting after a restart, or to another worker, may hold an id this broadcaster never issued
+    async def scenario():
+        broadcaster = Broadcaster()
+        subscription = _collect(broadcaster.subscribe(last_event_id = 500, keepalive = 5), 3)
+        task = asyncio.create_task(subscription)
+        await asyncio.sleep(0)
+        broadcaster.publish("order.created", 1, "pending", 1, 1)
+        broadcaster.publish("order.created", 2, "pending", 1, 1)
+        return await asyncio.wait_for(task, 1)
+
+    received = asyncio.run(scenario())
+    assert received[0].startswith("event: reset\n")
+    assert [message.split("\n")[0] for message in received[1:]] == ["id: 1", "id: 2"]
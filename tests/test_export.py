@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from my_app import database
+from my_app.archive import archive_orders
+from my_app.cli import main
+from my_app.export import stage_durations
+from my_app.models import Order, OrderHistory
+from tests.conftest import TestingSessionLocal
+
+def _order(client, *statuses):
+    order_id = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}]}).json()["id"]
+    for status in statuses:
+        client.patch(f"/orders/{order_id}/status", json = {"status": status})
+    return order_id
+
+def _ndjson(response):
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_export_orders_items_and_history(client):
+    first = _order(client, "preparing")
+    second = _order(client)
+
+    orders = _ndjson(client.get("/orders/export"))
+    assert [(o["id"], o["status"], o["total"]) for o in orders] == [(first, "preparing", 17.0), (second, "pending", 17.0)]
+    assert all(o["created_at"] for o in orders)
+    items = _ndjson(client.get("/orders/export", params = {"dataset": "items"}))
+    assert [(i["order_id"], i["menu_item_id"], i["quantity"], i["unit_price"]) for i in items] == [(first, 1, 2, 8.5), (second, 1, 2, 8.5)]
+    history = _ndjson(client.get("/orders/export", params = {"dataset": "history"}))
+    assert [(h["order_id"], h["previous_status"], h["new_status"]) for h in history] == [(first, "pending", "preparing")]
+
+def test_export_csv(client):
+    order_id = _order(client)
+    response = client.get("/orders/export", params = {"format": "csv"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="orders.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(int(row["id"]), row["status"]) for row in rows] == [(order_id, "pending")]
+
+def test_export_time_range(client, db_session):
+    old, new = _order(client), _order(client)
+    db_session.query(Order).filter(Order.id == old).update({"created_at": datetime.utcnow() - timedelta(days = 2)})
+    db_session.commit()
+    start = (datetime.utcnow() - timedelta(days = 1)).isoformat()
+    assert [o["id"] for o in _ndjson(client.get("/orders/export", params = {"start": start}))] == [new]
+    assert [o["id"] for o in _ndjson(client.get("/orders/export", params = {"end": start}))] == [old]
+    assert client.get("/orders/export", params = {"start": start, "end": start}).status_code == 400
+
+def test_stage_durations(client, db_session):
+    order_id = _order(client, "preparing", "ready", "served", "paid")
+    created = datetime(2025, 1, 1, 12, 0, 0)
+    db_session.query(Order).filter(Order.id == order_id).update({"created_at": created})
+    for minutes, entry in zip((5, 20, 22, 52), db_session.query(OrderHistory).filter(OrderHistory.order_id == order_id).order_by(OrderHistory.id)):
+        entry.timestamp = created + timedelta(minutes = minutes)
+    db_session.commit()
+    open_order = _order(client, "preparing")
+
+    stages = _ndjson(client.get("/orders/export", params = {"dataset": "stages"}))
+    assert stages[0] == {"order_id": order_id, "status": "paid", "created_at": created.isoformat(), "pending_seconds": 300.0,
+                         "preparing_seconds": 900.0, "ready_seconds": 120.0, "served_seconds": 1800.0, "total_seconds": 3120.0}
+    assert stages[1]["order_id"] == open_order
+    assert stages[1]["status"] == "preparing" and stages[1]["preparing_seconds"] is None and stages[1]["pending_seconds"] >= 0
+
+def test_stage_durations_one_pass():
+    t = datetime(2025, 1, 1)
+    transitions = iter([(1, t, "pending", "preparing", t + timedelta(seconds = 10)),
+                        (1, t, "preparing", "ready", t + timedelta(seconds = 30)),
+                        (2, None, "pending", "preparing", t)])
+    rows = list(stage_durations(transitions))
+    assert [(row["order_id"], row["pending_seconds"], row["preparing_seconds"]) for row in rows] == [(1, 10.0, 20.0), (2, None, None)]
+    assert rows[1]["total_seconds"] is None
+
+def test_export_includes_archived_orders(client, db_session):
+    archived = _order(client, "preparing", "ready", "served", "paid")
+    _order(client, "preparing")
+    assert archive_orders(db_session, datetime.utcnow() + timedelta(seconds = 1)) == 1
+    assert archived in [o["id"] for o in _ndjson(client.get("/orders/export"))]
+    assert [s["status"] for s in _ndjson(client.get("/orders/export", params = {"dataset": "stages"})) if s["order_id"] == archived] == ["paid"]
+
+def test_cli_export(client, tmp_path, monkeypatch):
+    order_id = _order(client)
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(database, "init_db", lambda: None)
+    output = tmp_path / "orders.csv"
+    assert main(["export", "orders", "--format", "csv", "--output", str(output)]) == 0
+    assert [int(row["id"]) for row in csv.DictReader(output.open())] == [order_id]
+
+def test_upgrade_backfills_created_at(tmp_path):
+    #a database from before created_at existed: the column is added by upgrade_db and must not stay NULL,
+    #or time-range exports silently skip those orders
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+    from my_app.database import create_engines, init_db, upgrade_db
+    from my_app.export import iter_rows
+    engine, _ = create_engines(f"sqlite:///{tmp_path / 'legacy.db'}")
+    init_db(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_orders_created_at_id"))
+        connection.execute(text("ALTER TABLE orders DROP COLUMN created_at_inferred"))
+        connection.execute(text("ALTER TABLE orders DROP COLUMN created_at"))
+        connection.execute(text("INSERT INTO orders (id, customer_id, status, total, version, updated_at) VALUES "
+                                "(1, 1, 'preparing', 5.0, 2, '2024-03-01 10:30:00.000000'), (2, 1, 'pending', 5.0, 1, '2024-03-02 09:00:00.000000')"))
+        connection.execute(text("INSERT INTO order_history (order_id, previous_status, new_status, timestamp) VALUES "
+                                "(1, 'pending', 'preparing', '2024-03-01 10:05:00.000000')"))
+    upgrade_db(engine)
+    #the backfill runs with the migration only, not on every start
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO orders (id, customer_id, status, total) VALUES (3, 1, 'pending', 5.0)"))
+        connection.execute(text("UPDATE orders SET created_at = NULL WHERE id = 3"))
+    upgrade_db(engine)
+
+    db = sessionmaker(bind = engine)()
+    try:
+        orders = list(iter_rows("orders", db, start = datetime(2020, 1, 1)))
+        assert [(o["id"], o["created_at"]) for o in orders] == [(1, datetime(2024, 3, 1, 10, 5)), (2, datetime(2024, 3, 2, 9, 0))]
+        assert db.query(Order.id).filter(Order.created_at_inferred).order_by(Order.id).all() == [(1,), (2,)]
+        #an estimated creation time gives no pending or total duration
+        stages = list(iter_rows("stages", db))
+        assert [(s["order_id"], s["created_at"], s["pending_seconds"], s["total_seconds"]) for s in stages] == [(1, None, None, None)]
+    finally:
+        db.close()
@@ -0,0 +1,95 @@
+import threading
+import time
+import uuid
+from my_app import idempotency, schemas, utilities
+from my_app.idempotency import IdempotencyCache
+from my_app.models import Order
+
+PAYLOAD = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}]}
+FINGERPRINT = utilities.payload_fingerprint(schemas.OrderCreate(**PAYLOAD))
+
+def _post(client, key, payload = PAYLOAD):
+    return client.post("/orders/", json = payload, headers = {"Idempotency-Key": key})
+
+def test_replay_returns_original_order(client, db_session):
+    key = uuid.uuid4().hex
+    first = _post(client, key)
+    assert first.status_code == 200, first.text
+    assert "Idempotent-Replayed" not in first.headers
+    client.patch(f"/orders/{first.json()['id']}/status", json = {"status": "preparing"})
+
+    replay = _post(client, key)
+    assert replay.status_code == 200
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert db_session.query(Order).count() == 1
+    assert _post(client, uuid.uuid4().hex).json()["id"] != first.json()["id"]
+
+def test_replay_after_cache_loss_uses_unique_index(client, db_session):
+    key = uuid.uuid4().hex
+    first = _post(client, key).json()
+    idempotency.orders.clear()
+
+    replay = _post(client, key)
+    assert replay.status_code == 200, replay.text
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json()["id"] == first["id"]
+    assert db_session.query(Order).count() == 1
+
+def test_reused_key_with_different_body_is_rejected(client, db_session):
+    key = uuid.uuid4().hex
+    first = _post(client, key).json()
+    changed = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 3}]}
+    response = _post(client, key, changed)
+    assert response.status_code == 422
+    #the fingerprint stored on the row still catches it once the cache has forgotten the key
+    idempotency.orders.clear()
+    assert _post(client, key, changed).status_code == 422
+    assert _post(client, key).json()["id"] == first["id"]
+    assert db_session.query(Order).count() == 1
+
+def test_failed_creation_is_not_remembered(client):
+    key = uuid.uuid4().hex
+    assert _post(client, key, {"customer_id": 999999, "items": [{"menu_item_id": 1, "quantity": 1}]}).status_code == 404
+    response = _post(client, key)
+    assert response.status_code == 200, response.text
+    assert "Idempotent-Replayed" not in response.headers
+
+def test_concurrent_duplicate_waits_for_in_flight_creation(client, db_session):
+    key = uuid.uuid4().hex
+    state, future = idempotency.orders.begin(key, FINGERPRINT)
+    assert state == "lead"
+    responses = []
+    collapsed = idempotency.orders.collapsed
+    duplicate = threading.Thread(target = lambda: responses.append(_post(client, key)))
+    duplicate.start()
+    #finish only once the duplicate is waiting on the in-flight future, not when it could still find the cached result
+    deadline = time.monotonic() + 5
+    while idempotency.orders.collapsed == collapsed and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert idempotency.orders.collapsed == collapsed + 1
+    original = schemas.OrderResponse(id = 42, customer_id = 1, status = "pending", total = 17.0, items = [])
+    idempotency.orders.finish(key, FINGERPRINT, future, original)
+    duplicate.join()
+
+    assert responses[0].status_code == 200
+    assert responses[0].json()["id"] == 42
+    assert responses[0].headers["Idempotent-Replayed"] == "true"
+    assert db_session.query(Order).count() == 0
+
+def test_cache_is_bounded_and_shares_errors_with_waiters():
+    cache = IdempotencyCache(max_size = 2, ttl = 60)
+    for key in ("a", "b", "c"):
+        _, future = cache.begin(key, "f")
+        cache.finish(key, "f", future, key.upper())
+    assert cache.begin("a", "f")[0] == "lead"
+    assert cache.begin("c", "f") == ("cached", "C")
+    assert cache.begin("c", "other") == ("mismatch", None)
+
+    _, future = cache.begin("d", "f")
+    assert cache.begin("d", "other") == ("mismatch", None)
+    state, waiting = cache.begin("d", "f")
+    assert state == "wait" and waiting is future
+    cache.finish("d", "f", future, error = ValueError("boom"))
+    assert isinstance(waiting.exception(), ValueError)
+    assert cache.begin("d", "f")[0] == "lead"
@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+import queue
+from my_app import database, logs
+from my_app.cli import main
+from tests.conftest import TestingSessionLocal
+
+def _lines(stream):
+    logs.stop()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_json_logs_carry_request_fields(client):
+    stream = io.StringIO()
+    logs.setup("json", stream = stream)
+    response = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}, headers = {"X-Request-ID": "abc123"})
+    order_id = response.json()["id"]
+    assert response.headers["X-Request-ID"] == "abc123"
+
+    lines = [line for line in _lines(stream) if line.get("request_id") == "abc123"]
+    created = next(line for line in lines if line.get("order_id") == order_id)
+    assert created["message"] == f"Order {order_id} created for customer 1, it costs total 8.5"
+    assert created["route"] == "/orders/" and created["method"] == "POST"
+    access = next(line for line in lines if "latency_ms" in line)
+    assert access["status"] == 200 and access["sql"] > 0
+
+def test_request_id_is_generated(client):
+    assert len(client.get("/orders/summary").headers["X-Request-ID"]) == 32
+
+def test_full_queue_drops_and_counts_records():
+    handler = logs.BoundedQueueHandler(queue.Queue(1))
+    logger = logging.getLogger("tests.logs.drop")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for i in range(3):
+            logger.warning("record %s", i)
+    finally:
+        logger.removeHandler(handler)
+    assert handler.dropped == 2
+    assert handler.queue.qsize() == 1
+
+def test_messages_are_formatted_by_the_listener():
+    class Expensive:
+        calls = 0
+        def __str__(self):
+            Expensive.calls += 1
+            return "expensive"
+
+    handler = logs.BoundedQueueHandler(queue.Queue(10))
+    logger = logging.getLogger("tests.logs.lazy")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("value %s", Expensive())
+    finally:
+        logger.removeHandler(handler)
+    assert Expensive.calls == 0
+    record = handler.queue.get_nowait()
+    assert logs.JsonFormatter().format(record) and Expensive.calls == 1
+
+def test_dropped_records_are_exported(client):
+    assert "log_records_dropped " in client.get("/metrics").text
+
+def test_cli_logs_job_progress(client, monkeypatch, capsys):
+    order_id = client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}).json()["id"]
+    for status in ("preparing", "ready", "served", "paid"):
+        client.patch(f"/orders/{order_id}/status", json = {"status": status})
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(database, "init_db", lambda: None)
+    assert main(["archive", "--days", "0"]) == 0
+    assert f"Archived 1 paid orders (up to order {order_id}), 1 so far" in capsys.readouterr().err
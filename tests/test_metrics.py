@@ -0,0 +1,48 @@
+import pytest
+from my_app import metrics
+from my_app.metrics import Histogram
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "test latency", ("route",), buckets = (0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+    samples = {name + labels: value for name, labels, value in histogram.samples()}
+    assert samples['latency_seconds_bucket{route="/a",le="0.1"}'] == 1
+    assert samples['latency_seconds_bucket{route="/a",le="1.0"}'] == 2
+    assert samples['latency_seconds_bucket{route="/a",le="+Inf"}'] == 3
+    assert samples['latency_seconds_count{route="/a"}'] == 3
+    assert samples['latency_seconds_sum{route="/a"}'] == pytest.approx(5.55)
+
+def test_metrics_endpoint_reports_routes_and_sql(client):
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]}
+    order_id = client.post("/orders/", json = payload).json()["id"]
+    requests_before = metrics.requests_total.value("GET", "/orders/{id}", 200)
+    statements_before = metrics.request_statements.count("GET", "/orders/{id}")
+    client.get(f"/orders/{order_id}")
+
+    assert metrics.requests_total.value("GET", "/orders/{id}", 200) == requests_before + 1
+    assert metrics.request_statements.count("GET", "/orders/{id}") == statements_before + 1
+    assert metrics.commit_duration.count() > 0
+
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/orders/{id}",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/orders/",le="+Inf"}' in body
+    assert 'http_requests_in_flight{method="GET",route="/metrics"} 1' in body
+    assert "# TYPE db_statements_per_request histogram" in body
+    assert "menu_catalog_hits " in body
+    assert "status_write_queue_depth 0" in body
+
+def test_failed_statements_leave_no_timer_on_the_connection(db_session):
+    from sqlalchemy.exc import OperationalError
+    with db_session.get_bind().connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql("SELECT * FROM no_such_table")
+        before = metrics.statement_duration.count()
+        connection.exec_driver_sql("SELECT 1")
+        assert metrics.statement_duration.count() == before + 1
+        assert not any(value for key, value in connection.info.items() if "started" in key)
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import event
+from benchmarks.run import QUERY_BUDGETS
+from my_app.models import Customer
+
+@pytest.fixture(scope="function")
+def count_statements(db_session):
+    engine = db_session.get_bind()
+
+    def count(send):
+        statements = []
+        listener = lambda conn, cursor, statement, parameters, context, executemany: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = send()
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert response.status_code < 400, response.text
+        return len(statements)
+
+    return count
+
+def _seed_orders(client, count):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}, {"menu_item_id": 2, "quantity": 2}]} for _ in range(count)]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+    client.patch("/orders/status", json = {"ids": order_ids, "status": "preparing"})
+    return order_ids
+
+def test_routes_stay_within_query_budget(client, db_session, count_statements):
+    order_ids = _seed_orders(client, 20)
+    #a second table whose orders are all served, so paying it succeeds
+    db_session.add(Customer(table_number = 2, is_present = True))
+    db_session.commit()
+    table_customer = db_session.query(Customer.id).filter(Customer.table_number == 2).scalar()
+    served = [result["order"]["id"] for result in client.post("/orders/bulk", json = [{"customer_id": table_customer, "items": [{"menu_item_id": 1, "quantity": 1}]}] * 5).json()]
+    for status in ("preparing", "ready", "served"):
+        client.patch("/orders/status", json = {"ids": served, "status": status})
+    bulk_payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}, {"menu_item_id": 2, "quantity": 1}]} for _ in range(20)]
+    requests = {
+        "create_order": lambda: client.post("/orders/", json = bulk_payload[0]),
+        "create_orders_bulk": lambda: client.post("/orders/bulk", json = bulk_payload),
+        "update_orders_status": lambda: client.patch("/orders/status", json = {"ids": order_ids[:10], "status": "ready"}),
+        "update_order_status": lambda: client.patch(f"/orders/{order_ids[10]}/status", json = {"status": "ready"}),
+        "list_order_details": lambda: client.get(f"/orders/{order_ids[0]}"),
+        "list_orders": lambda: client.get("/orders/", params = {"limit": 100}),
+        "list_orders_by_status": lambda: client.get("/orders/", params = {"status": "preparing", "limit": 100}),
+        "get_order_history": lambda: client.get(f"/orders/{order_ids[0]}/history"),
+        "get_orders_summary": lambda: client.get("/orders/summary"),
+        "get_customer_orders": lambda: client.get("/customers/1/orders"),
+        "get_table_bill": lambda: client.get("/tables/1/bill"),
+        "pay_table": lambda: client.post("/tables/2/pay"),
+        "delete_order": lambda: client.delete(f"/orders/{order_ids[-1]}"),
+    }
+    assert set(requests) == set(QUERY_BUDGETS)
+    for name, send in requests.items():
+        assert count_statements(send) <= QUERY_BUDGETS[name], name
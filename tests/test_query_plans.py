@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import event
+
+HOT_TABLES = ("orders", "order_items", "order_history")
+
+@pytest.fixture(scope="function")
+def captured_statements(db_session):
+    engine = db_session.get_bind()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(engine, "before_cursor_execute", capture)
+
+def _plan(engine, statement, parameters):
+    with engine.connect() as connection:
+        return [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+def _assert_indexed(db_session, statements):
+    assert statements
+    for statement, parameters in statements:
+        for step in _plan(db_session.get_bind(), statement, parameters):
+            assert not any(step.startswith(f"SCAN {table}") for table in HOT_TABLES), f"{step} in:\n{statement}"
+            assert "TEMP B-TREE" not in step, f"{step} in:\n{statement}"
+
+def _create_order(client):
+    payload = {"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}, {"menu_item_id": 2, "quantity": 1}]}
+    order_id = client.post("/orders/", json = payload).json()["id"]
+    client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+    return order_id
+
+def test_list_orders_by_status_uses_indexes(client, db_session, captured_statements):
+    _create_order(client)
+    captured_statements.clear()
+    client.get("/orders/", params = {"status": "preparing", "limit": 10, "after": 0})
+    _assert_indexed(db_session, captured_statements)
+
+def test_list_orders_uses_indexes(client, db_session, captured_statements):
+    _create_order(client)
+    captured_statements.clear()
+    client.get("/orders/", params = {"limit": 10})
+    _assert_indexed(db_session, captured_statements)
+
+def test_order_details_uses_indexes(client, db_session, captured_statements):
+    order_id = _create_order(client)
+    captured_statements.clear()
+    client.get(f"/orders/{order_id}")
+    _assert_indexed(db_session, captured_statements)
+
+def test_order_history_uses_indexes(client, db_session, captured_statements):
+    order_id = _create_order(client)
+    captured_statements.clear()
+    client.get(f"/orders/{order_id}/history")
+    _assert_indexed(db_session, captured_statements)
+
+def test_update_order_status_uses_indexes(client, db_session, captured_statements):
+    order_id = _create_order(client)
+    captured_statements.clear()
+    client.patch(f"/orders/{order_id}/status", json = {"status": "ready"})
+    _assert_indexed(db_session, captured_statements)
+
+def test_delete_order_uses_indexes(client, db_session, captured_statements):
+    order_id = _create_order(client)
+    captured_statements.clear()
+    client.delete(f"/orders/{order_id}")
+    _assert_indexed(db_session, captured_statements)
+
+def test_conditional_requests_use_indexes(client, db_session, captured_statements):
+    order_id = _create_order(client)
+    etag = client.get(f"/orders/{order_id}").headers["ETag"]
+    page_etag = client.get("/orders/", params = {"status": "preparing", "limit": 10}).headers["ETag"]
+    captured_statements.clear()
+    assert client.get(f"/orders/{order_id}", headers = {"If-None-Match": etag}).status_code == 304
+    assert client.get("/orders/", params = {"status": "preparing", "limit": 10}, headers = {"If-None-Match": page_etag}).status_code == 304
+    assert len(captured_statements) == 2
+    _assert_indexed(db_session, captured_statements)
+
+@pytest.mark.parametrize("path", ["/customers/{customer_id}/orders", "/tables/1/bill"])
+def test_customer_and_table_views_use_covering_index(client, db_session, captured_statements, path):
+    order_id = _create_order(client)
+    customer_id = client.get(f"/orders/{order_id}").json()["customer_id"]
+    captured_statements.clear()
+    client.get(path.format(customer_id = customer_id))
+    _assert_indexed(db_session, captured_statements)
+    #the (id, total) lookup comes before the order and item loads
+    totals = captured_statements[-3]
+    assert any("COVERING INDEX ix_orders_customer_id_status" in step for step in _plan(db_session.get_bind(), *totals))
+
+def test_pay_table_uses_indexes(client, db_session, captured_statements):
+    order_id = _create_order(client)
+    for status in ("ready", "served"):
+        client.patch(f"/orders/{order_id}/status", json = {"status": status})
+    captured_statements.clear()
+    assert client.post("/tables/1/pay").status_code == 200
+    _assert_indexed(db_session, captured_statements)
+
+@pytest.mark.parametrize("ranged", [False, True])
+@pytest.mark.parametrize("dataset", ["orders", "items", "history", "stages"])
+def test_export_reads_in_index_order(client, db_session, captured_statements, dataset, ranged):
+    #exports must stream in index order rather than sort first, and a time range must seek instead of
+    #scanning the hot and archive tables
+    _create_order(client)
+    captured_statements.clear()
+    params = {"dataset": dataset, "start": "2020-01-01T00:00:00"} if ranged else {"dataset": dataset}
+    assert client.get("/orders/export", params = params).status_code == 200
+    assert captured_statements
+    for statement, parameters in captured_statements:
+        for step in _plan(db_session.get_bind(), statement, parameters):
+            assert "TEMP B-TREE" not in step, f"{step} in:\n{statement}"
+            assert not (ranged and step.startswith("SCAN")), f"{step} in:\n{statement}"
@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import text
+from my_app import summary
+
+def test_summary_follows_order_writes(client):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}]} for _ in range(3)]
+    order_ids = [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+    client.patch(f"/orders/{order_ids[0]}/status", json = {"status": "preparing"})
+    client.patch("/orders/status", json = {"ids": order_ids[1:], "status": "preparing"})
+    client.patch("/orders/status", json = {"ids": order_ids[2:], "status": "ready"})
+    client.patch(f"/orders/{order_ids[2]}/status", json = {"status": "paid"})
+    client.delete(f"/orders/{order_ids[1]}")
+
+    response = client.get("/orders/summary")
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "counts": {"pending": 0, "preparing": 1, "ready": 0, "served": 0, "paid": 1},
+        "open_orders": 1,
+        "open_revenue": 17.0,
+    }
+
+def test_check_reports_and_rebuild_repairs_drift(client, db_session):
+    client.post("/orders/", json = {"customer_id": 1, "items": [{"menu_item_id": 2, "quantity": 1}]})
+    assert summary.check(db_session) == []
+
+    db_session.execute(text("UPDATE order_status_summary SET order_count = order_count + 5 WHERE status = 'pending'"))
+    db_session.commit()
+    assert summary.check(db_session) == [{"status": "pending", "order_count": 6, "expected_order_count": 1,
+                                          "total_cents": 250, "expected_total_cents": 250}]
+
+    summary.rebuild(db_session.connection())
+    db_session.commit()
+    assert summary.check(db_session) == []
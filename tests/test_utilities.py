@@ -1,6 +1,6 @@
 import pytest
 from my_app.models import MenuItem, Order, OrderItem
-from my_app.utilities import compute_order_total 
+from my_app.utilities import backfill_price_snapshots, compute_order_total, verify_order_totals
 
 def test_compute_order_total(db_session):
     menu_item1 = MenuItem(name="Burger", price=8.0)
@@ -18,4 +18,34 @@ def test_compute_order_total(db_session):
     db_session.commit()
 
     total = compute_order_total(order, db_session)
-    assert total == 8.0 * 2 + 4.0 * 3
\ No newline at end of file
+    assert total == 8.0 * 2 + 4.0 * 3
+
+def test_compute_order_total_uses_price_snapshot(db_session):
+    menu_item = MenuItem(name="Burger", price=8.0)
+    db_session.add(menu_item)
+    db_session.commit()
+    order = Order(total = 0.0)
+    db_session.add(order)
+    db_session.commit()
+    db_session.add(OrderItem(order_id=order.id, menu_item_id=menu_item.id, quantity=2, unit_price_cents=750))
+    menu_item.price = 9.0
+    db_session.commit()
+
+    assert compute_order_total(order, db_session) == 15.0
+
+def test_backfill_and_verify_price_snapshots(db_session):
+    menu_item = MenuItem(name="Burger", price=8.0)
+    db_session.add(menu_item)
+    db_session.commit()
+    matching = Order(total = 16.0)
+    drifted = Order(total = 10.0)
+    db_session.add_all([matching, drifted])
+    db_session.commit()
+    db_session.add_all([OrderItem(order_id=matching.id, menu_item_id=menu_item.id, quantity=2),
+                        OrderItem(order_id=drifted.id, menu_item_id=menu_item.id, quantity=1)])
+    db_session.commit()
+
+    assert [m["order_id"] for m in verify_order_totals(db_session)] == [matching.id, drifted.id]
+    assert backfill_price_snapshots(db_session) == 2
+    db_session.commit()
+    assert verify_order_totals(db_session) == [{"order_id": drifted.id, "total": 10.0, "items_total": 8.0}]
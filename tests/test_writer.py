@@ -0,0 +1,74 @@
+import pytest
+from fastapi import HTTPException
+from my_app import config, writer
+from my_app.models import Order, OrderHistory
+from my_app.writer import StatusWriteQueue
+from tests.conftest import TestingSessionLocal
+
+def _create_orders(client, count):
+    payload = [{"customer_id": 1, "items": [{"menu_item_id": 1, "quantity": 1}]} for _ in range(count)]
+    return [result["order"]["id"] for result in client.post("/orders/bulk", json = payload).json()]
+
+def test_status_queue_applies_writes_in_one_batch(client, db_session):
+    order_ids = _create_orders(client, 3)
+    status_queue = StatusWriteQueue(TestingSessionLocal, max_batch = 10)
+    #queue everything before the writer starts so it drains a single batch
+    futures = [status_queue.submit(order_id, "preparing") for order_id in order_ids]
+    futures.append(status_queue.submit(order_ids[0], "ready"))
+    missing = status_queue.submit(9999, "ready")
+    status_queue.start()
+    try:
+        assert [future.result(timeout = 5) for future in futures] == [("pending", "preparing")] * 3 + [("preparing", "ready")]
+        with pytest.raises(HTTPException) as error:
+            missing.result(timeout = 5)
+        assert error.value.status_code == 404
+    finally:
+        status_queue.stop()
+
+    stats = status_queue.stats()
+    assert stats["batches"] == 1 and stats["last_batch_size"] == 5 and stats["depth"] == 0
+    db_session.expire_all()
+    assert db_session.get(Order, order_ids[0]).status == "ready"
+    assert db_session.query(OrderHistory).filter(OrderHistory.order_id.in_(order_ids)).count() == 4
+
+def test_patch_order_status_through_queue(client, monkeypatch):
+    order_id = _create_orders(client, 1)[0]
+    status_queue = StatusWriteQueue(TestingSessionLocal)
+    monkeypatch.setattr(writer, "status_queue", status_queue)
+    status_queue.start()
+    try:
+        response = client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+        assert response.status_code == 200, response.text
+        assert response.json()["status"] == "preparing"
+        response = client.patch("/orders/9999/status", json = {"status": "preparing"})
+        assert response.status_code == 404, response.text
+    finally:
+        status_queue.stop()
+    assert status_queue.stats()["writes"] == 2
+
+def test_full_queue_rejects_fast(client, monkeypatch):
+    order_id = _create_orders(client, 1)[0]
+    status_queue = StatusWriteQueue(TestingSessionLocal, max_depth = 1)
+    status_queue.submit(order_id, "preparing")
+    with pytest.raises(HTTPException) as error:
+        status_queue.submit(order_id, "ready")
+    assert error.value.status_code == 503
+
+    #the writer is "running" but never drains, so the request must be turned away rather than wait for room
+    monkeypatch.setattr(writer, "status_queue", status_queue)
+    monkeypatch.setattr(StatusWriteQueue, "running", True)
+    response = client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+    assert response.status_code == 503, response.text
+    assert response.headers["Retry-After"] == "1"
+    assert status_queue.stats()["rejected"] == 2
+
+def test_slow_queued_write_times_out_without_claiming_failure(client, monkeypatch):
+    order_id = _create_orders(client, 1)[0]
+    #running but never drained: the write is accepted and still pending when the request gives up
+    monkeypatch.setattr(writer, "status_queue", StatusWriteQueue(TestingSessionLocal))
+    monkeypatch.setattr(StatusWriteQueue, "running", True)
+    monkeypatch.setattr(config, "STATUS_WRITE_TIMEOUT", 0.01)
+    response = client.patch(f"/orders/{order_id}/status", json = {"status": "preparing"})
+    assert response.status_code == 504, response.text
+    assert "may yet be applied" in response.json()["detail"]
+    assert writer.status_queue.stats()["depth"] == 1